@@ -8,6 +8,7 @@
 - ToolNotFoundError: 工具未找到异常
 - ToolExecutionError: 工具执行异常
 - StateValidationError: 状态验证异常
+- AgentCache: 智能体工具结果缓存
 
 具体智能体实现：
 - PlannerAgent: 任务规划智能体
@@ -24,6 +25,7 @@ from .base import (
     ToolExecutionError,
     ToolNotFoundError,
 )
+from .cache import AgentCache
 
 __all__ = [
     "BaseAgent",
@@ -33,4 +35,5 @@ __all__ = [
     "ToolNotFoundError",
     "ToolExecutionError",
     "StateValidationError",
+    "AgentCache",
 ]
@@ -5,15 +5,35 @@
 - 工具调用接口（基于 LangChain Tool）
 - 消息传递机制（基于 LangChain Message）
 - 完善的日志记录和错误处理
+- 基于 SQLite 的状态检查点，支持中断后恢复
 """
+import asyncio
+import inspect
+import logging
+import random
+import time
 from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import Any, Callable, Dict, List, Optional, TypedDict, Union
+from functools import partial
+from types import MappingProxyType
+from typing import Any, Callable, ClassVar, Dict, List, Optional, Tuple, TypedDict, Union, get_type_hints
+from weakref import WeakValueDictionary
 
-from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+import httpx
+import orjson
+import requests
+from langchain_core.messages import (
+    AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage, message_to_dict, messages_from_dict
+)
 from langchain_core.tools import BaseTool, StructuredTool
 
+from ..core.checkpoint import Checkpointer
+from ..core.config import settings
 from ..core.logging import get_logger
+from .cache import AgentCache
 
 logger = get_logger(__name__)
 
@@ -28,12 +48,22 @@ class AgentStatus(str, Enum):
         WAITING: 智能体等待工具调用结果
         COMPLETED: 任务执行成功完成
         FAILED: 任务执行过程中发生异常
+    
+    Note:
+        保持 str 枚举以兼容字符串形式的状态（序列化、数据库、与 "idle" 等直接比较）。
+        枚举成员是单例，路由等热路径中建议用 ``status is AgentStatus.RUNNING`` 做身份比较，
+        只比较对象地址，避免 str.__eq__ 的逐字符比较。
     """
     IDLE = "idle"
     RUNNING = "running"
     WAITING = "waiting"
     COMPLETED = "completed"
     FAILED = "failed"
+    
+    @property
+    def is_terminal(self) -> bool:
+        """是否为终止状态（COMPLETED/FAILED），供工作流路由判断是否结束"""
+        return self is AgentStatus.COMPLETED or self is AgentStatus.FAILED
 
 class AgentState(TypedDict, total=False):
     """智能体状态定义
@@ -42,7 +72,9 @@ class AgentState(TypedDict, total=False):
     所有字段都是可选的（total=False），以支持增量更新。
     
     Attributes:
-        messages: 消息历史列表，记录智能体与用户、其他智能体之间的对话
+        messages: 消息历史，记录智能体与用户、其他智能体之间的对话；
+            BaseAgent 使用列表存储，最多保留 max_message_history 条消息，超出后丢弃最早的非系统消息；
+            SystemMessage 始终保留，智能体不会因历史过长丢失指令
         current_task: 当前正在处理的任务描述
         agent_type: 智能体类型标识（planner/researcher/analyzer/writer）
         status: 智能体当前运行状态
@@ -60,6 +92,49 @@ class AgentState(TypedDict, total=False):
     error: str
     metadata: Dict[str, Any]
 
+# AgentState 允许的字段集合，供 update_state 做 O(1) 成员判断
+_ALLOWED_STATE_KEYS = frozenset(AgentState.__annotations__)
+
+# 只读场景下字段缺失时使用的共享默认值，避免每次调用都创建新的空列表/字典
+_EMPTY_MESSAGES: Tuple[BaseMessage, ...] = ()
+_EMPTY_MAPPING = MappingProxyType({})
+
+# 初始状态模板：不可变字段直接共享，可变容器字段在 _init_state 中替换为新对象。
+# dict.copy() 比逐个关键字参数构造 TypedDict 更快，且保持字段顺序不变。
+_STATE_TEMPLATE: AgentState = {
+    "messages": _EMPTY_MESSAGES,
+    "current_task": "",
+    "agent_type": "",
+    "status": AgentStatus.IDLE,
+    "tools_output": _EMPTY_MAPPING,
+    "context": _EMPTY_MAPPING,
+    "error": "",
+    "metadata": _EMPTY_MAPPING,
+}
+
+def _preview(content: Any, limit: int = 50) -> str:
+    """生成内容预览，超过 limit 个字符时截断并以 ... 结尾"""
+    text = content if type(content) is str else str(content)
+    return f"{text[:limit]}..." if len(text) > limit else text
+
+def _state_default(obj: Any) -> Any:
+    """orjson 序列化状态时处理其原生不支持的类型
+
+    消息转换为 LangChain 的字典格式以便恢复；无法识别的对象抛出 TypeError，
+    由调用方跳过所在字段，避免恢复后的检查点中悄悄变成字符串。
+    """
+    if isinstance(obj, BaseMessage):
+        return message_to_dict(obj)
+    if isinstance(obj, (deque, tuple, set, frozenset)):
+        return list(obj)
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"无法序列化 {type(obj).__name__} 类型的值")
+
+# 自动检查点的后台写入线程：在事件循环中进入终止状态时，SQLite 写入交给该线程执行，不阻塞事件循环。
+# 只有一个线程，写入按提交顺序执行，同一键的后一次写入不会被前一次覆盖；线程在首次提交任务时才创建
+_CHECKPOINT_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agent-checkpoint")
+
 class AgentError(Exception):
     """智能体异常基类
     
@@ -69,8 +144,15 @@ class AgentError(Exception):
         agent_name: 发生异常的智能体名称
         message: 错误消息
         original_error: 原始异常（如果有）
+    
+    Note:
+        异常本身不记录日志，由抛出异常的调用方在 raise 前记录，
+        避免被捕获并妥善处理的异常也产生 ERROR 日志。
     """
     
+    # 异常在重试、并发调用中会被大量创建，使用 __slots__ 省去每个实例的 __dict__
+    __slots__ = ("agent_name", "message", "original_error", "_formatted")
+    
     def __init__(
         self,
         message: str,
@@ -80,8 +162,8 @@ class AgentError(Exception):
         self.agent_name = agent_name
         self.message = message
         self.original_error = original_error
-        logger.error(self._format_message())      # 记录异常日志
-        super().__init__(self._format_message())  # 初始化父类异常，包含格式化后的消息
+        self._formatted = self._format_message()  # 只格式化一次，str(exc) 直接复用
+        super().__init__(self._formatted)         # 初始化父类异常，包含格式化后的消息
 
     
     def _format_message(self) -> str:
@@ -92,18 +174,26 @@ class AgentError(Exception):
         if self.original_error:
             parts.append(f"原因: {str(self.original_error)}")
         return " | ".join(parts)
+    
+    def __str__(self) -> str:
+        return self._formatted
+    
+    def __reduce__(self):
+        # __slots__ 属性不在 BaseException 的默认 pickle 状态中，且默认按 cls(格式化后的消息) 重建，
+        # 需显式按构造参数重建，保证异常跨进程（src/workers、concurrent.futures）传递后字段不丢失
+        return (type(self), (self.message, self.agent_name, self.original_error))
 
 class ToolNotFoundError(AgentError):
     """工具未找到异常"""
-    pass
+    __slots__ = ()
 
 class ToolExecutionError(AgentError):
     """工具执行异常"""
-    pass
+    __slots__ = ()
 
 class StateValidationError(AgentError):
     """状态验证异常"""
-    pass
+    __slots__ = ()
 
 class BaseAgent(ABC):
     """智能体抽象基类
@@ -139,13 +229,30 @@ class BaseAgent(ABC):
         ...         return state
     """
     
+    RETRY_BACKOFF: float = 0.5      # 重试的初始退避时间（秒），每次失败后翻倍
+    RETRY_BACKOFF_MAX: float = 5.0  # 单次退避时间上限（秒）
+    # 只对可能是暂时性的错误重试：连接错误和超时，包括 httpx 的传输层错误（ConnectError、ReadTimeout 等，
+    # 不是 OSError 的子类）和 requests 的连接/超时错误。FileNotFoundError、PermissionError 等确定性的 OSError、
+    # 参数错误、工具内部 bug 每次都会同样失败，直接抛出；子类可按所用客户端扩展
+    RETRYABLE_ERRORS: ClassVar[Tuple[type, ...]] = (
+        ConnectionError, TimeoutError, asyncio.TimeoutError,
+        httpx.TransportError, requests.ConnectionError, requests.Timeout,
+    )
+    
+    # 进程内共享的函数工具转换结果，键为原始函数的 id。
+    # 多个智能体注册同一个函数时复用同一个 StructuredTool；没有智能体引用后自动回收。
+    # 转换结果持有原始函数的引用，因此条目存活期间该 id 不会被其他对象复用。
+    _shared_tools: ClassVar["WeakValueDictionary[int, BaseTool]"] = WeakValueDictionary()
+    
     def __init__(
         self,
         llm: Optional[Any] = None,
         tools: Optional[List[Union[BaseTool, Callable]]] = None,
         system_prompt: Optional[str] = None,
         max_retries: Optional[int] = None,
-        timeout: Optional[float] = None
+        timeout: Optional[float] = None,
+        cache: Optional[AgentCache] = None,
+        checkpointer: Optional[Checkpointer] = None
     ):
         """初始化智能体
         
@@ -156,23 +263,33 @@ class BaseAgent(ABC):
             state: 初始状态, 用于初始化智能体的状态
             max_retries: 工具调用最大重试次数，默认从配置读取
             timeout: 工具调用超时时间（秒），默认从配置读取
+            cache: 工具结果缓存（可选），可在多个智能体之间共享；为 None 时不缓存
+            checkpointer: 检查点存储（可选）；设置后状态进入 COMPLETED/FAILED 时自动保存检查点
         """
         self._llm = llm
-        self._tools: Dict[str, BaseTool] = {}
+        self._tools: Dict[str, Union[BaseTool, Callable]] = {}  # 函数工具在首次使用时才转换为 StructuredTool
+        # 每个工具名称的注册版本，参与缓存键的计算：覆盖或重新注册同名工具后，旧工具的缓存结果不再命中
+        self._tool_versions: Dict[str, int] = {}
         self._system_prompt = system_prompt or self.default_system_prompt
+        # 系统消息只构造一次，每次准备 LLM 消息时复用
+        self._system_message = SystemMessage(content=self._system_prompt) if self._system_prompt else None
         self._state: AgentState = self._init_state()
         self._max_retries = max_retries if max_retries is not None else 3
         self._timeout = timeout if timeout is not None else 30.0
+        self._cache = cache
+        self._checkpointer = checkpointer
+        self._pending_checkpoints: set = set()  # 尚未完成的后台检查点写入
         
         if tools:
             for tool in tools:
                 self.register_tool(tool)
         
-        logger.debug(
-            "智能体初始化完成: name=%s, "
-            "tools:{'count': %d, 'names': %s}, max_retries=%d "
-            % (self.name, len(self._tools), self.tool_names, self._max_retries)
-        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "智能体初始化完成: name=%s, "
+                "tools:{'count': %d, 'names': %s}, max_retries=%d ",
+                self.name, len(self._tools), self.tool_names, self._max_retries
+            )
     
     @property
     @abstractmethod
@@ -193,13 +310,13 @@ class BaseAgent(ABC):
     
     @property
     def tools(self) -> List[BaseTool]:
-        """获取已注册的工具列表"""
-        return list(self._tools.values())
+        """获取已注册的工具列表（会完成所有尚未转换的函数工具的转换）"""
+        return [self.get_tool(name) for name in list(self._tools)]
     
     @property
     def tool_names(self) -> List[str]:
         """获取已注册的工具名称列表"""
-        return list(self._tools.keys())
+        return list(self._tools)
     
     @property
     def state(self) -> AgentState:
@@ -222,23 +339,48 @@ class BaseAgent(ABC):
         Returns:
             初始化后的 AgentState 实例
         """
-        return AgentState(
-            messages=[],
-            current_task="",
-            agent_type=self.name,
-            status=AgentStatus.IDLE,
-            tools_output={},
-            context={},
-            error="",
-            metadata={}
-        )
+        # 消息历史中 SystemMessage 的数量，为 0 时 get_messages(include_system=False) 无需过滤。
+        # 超出上限时只丢弃非系统消息，计数无需随淘汰扣减
+        self._system_msg_count = 0
+        state = _STATE_TEMPLATE.copy()
+        state["messages"] = self._new_message_history()
+        state["agent_type"] = self.name
+        state["tools_output"] = {}
+        state["context"] = {}
+        state["metadata"] = {}
+        return state
+    
+    def _new_message_history(self) -> List[BaseMessage]:
+        """创建消息历史容器
+        
+        Returns:
+            空列表，长度上限由 add_message 通过 _trim_message_history 维持
+        """
+        return []
+    
+    @staticmethod
+    def _trim_message_history(messages: List[BaseMessage]) -> None:
+        """消息数超过 settings.max_message_history 时，从最早的非系统消息开始丢弃
+        
+        SystemMessage 不参与淘汰，全部保留。add_message 每次最多超出一条，
+        只需跳过开头的系统消息并删除一个元素；上限为数百条时删除的移动开销可以忽略，
+        内存占用不随会话长度增长。
+        """
+        excess = len(messages) - settings.max_message_history
+        i = 0
+        while excess > 0 and i < len(messages):
+            if isinstance(messages[i], SystemMessage):
+                i += 1
+            else:
+                del messages[i]
+                excess -= 1
     
     def reset_state(self) -> None:
         """重置智能体状态到初始状态
         
         清空所有消息、上下文和工具输出，状态重置为 IDLE。
         """
-        logger.info(f"[{self.name}] 重置智能体状态")
+        logger.info("[%s] 重置智能体状态", self.name)
         self._state = self._init_state()
     
     def update_state(self, **kwargs) -> None:
@@ -251,14 +393,20 @@ class BaseAgent(ABC):
         """
         updated_states = {}
         for key, value in kwargs.items():
-            if key in AgentState.__annotations__:
+            if key in _ALLOWED_STATE_KEYS:
                 self._state[key] = value
                 updated_states[key] = value
             else:
-                logger.warning(f"[{self.name}] 忽略未知状态字段: {key}")
+                logger.warning("[%s] 忽略未知状态字段: %s", self.name, key)
         
         if self.validate_state() and updated_states:
-            logger.debug(f"[{self.name}] 状态验证通过，更新状态: {updated_states}")
+            logger.debug("[%s] 状态验证通过，更新状态: %s", self.name, updated_states)
+        
+        if "messages" in updated_states:
+            self._recount_system_messages()
+        
+        if updated_states.get("status") in (AgentStatus.COMPLETED, AgentStatus.FAILED):
+            self._auto_checkpoint()
     
     def validate_state(self) -> bool:
         """验证当前状态是否有效
@@ -269,13 +417,16 @@ class BaseAgent(ABC):
         Raises:
             StateValidationError: 如果状态无效
         """
-        if self._state.get("status") is None:
+        state = self._state
+        if state.get("status") is None:
+            logger.error("[%s] 状态缺少 status 字段", self.name)
             raise StateValidationError(
                 "状态缺少 status 字段",
                 agent_name=self.name
             )
         
-        if not isinstance(self._state.get("messages", []), list):
+        if not isinstance(state.get("messages", []), list):
+            logger.error("[%s] messages 必须是列表类型", self.name)
             raise StateValidationError(
                 "messages 必须是列表类型",
                 agent_name=self.name
@@ -292,7 +443,8 @@ class BaseAgent(ABC):
         """注册工具
         
         将工具添加到智能体的工具列表中。支持 BaseTool 实例或普通可调用函数。
-        普通函数会自动转换为 StructuredTool。
+        普通函数会在首次被获取或调用时自动转换为 StructuredTool，
+        避免为注册后从未使用的工具解析签名和构建参数模型。
         
         Args:
             tool: 工具实例或可调用函数
@@ -301,25 +453,47 @@ class BaseAgent(ABC):
         
         Raises:
             ValueError: 如果工具类型不支持
+            ValueError: 如果函数工具缺少文档字符串，或签名、类型注解无法解析
             ValueError: 如果工具名称已存在且未设置 overwrite
         """
         if isinstance(tool, BaseTool):
             tool_name = name or tool.name
         elif callable(tool):
             tool_name = name or tool.__name__
-            tool = StructuredTool.from_function(tool)
+            self._check_function_tool(tool, tool_name)
         else:
-            logger.error(f"[{self.name}] 不支持的工具类型: {type(tool)}，必须是 BaseTool 实例或可调用函数")
+            logger.error("[%s] 不支持的工具类型: %s，必须是 BaseTool 实例或可调用函数", self.name, type(tool))
             raise ValueError(f"不支持的工具类型: {type(tool)}，必须是 BaseTool 实例或可调用函数")
         
         if tool_name in self._tools:
             if not overwrite:
-                logger.error(f"[{self.name}] 工具 '{tool_name}' 已存在，使用 overwrite=True 来覆盖")
+                logger.error("[%s] 工具 '%s' 已存在，使用 overwrite=True 来覆盖", self.name, tool_name)
                 raise ValueError(f"工具 '{tool_name}' 已存在，使用 overwrite=True 来覆盖")
-            logger.warning(f"[{self.name}] 工具 '{tool_name}' 将被覆盖")
+            logger.warning("[%s] 工具 '%s' 将被覆盖", self.name, tool_name)
         
         self._tools[tool_name] = tool
-        logger.info(f"[{self.name}] 注册工具: {tool_name}")
+        self._tool_versions[tool_name] = self._tool_versions.get(tool_name, -1) + 1
+        logger.info("[%s] 注册工具: %s", self.name, tool_name, extra={"agent": self.name, "tool": tool_name})
+    
+    def _check_function_tool(self, func: Callable, tool_name: str) -> None:
+        """注册时检查函数工具能否转换为 StructuredTool
+        
+        转换本身推迟到首次使用，但 StructuredTool.from_function 会拒绝的情况
+        （缺少文档字符串、签名或类型注解无法解析）在注册时就报错，
+        避免之后在 invoke_tool 或 tools 属性中才抛出未包装的异常。
+        
+        Raises:
+            ValueError: 函数无法转换为工具
+        """
+        if not func.__doc__:
+            logger.error("[%s] 函数工具 '%s' 缺少文档字符串，无法作为工具描述", self.name, tool_name)
+            raise ValueError(f"函数工具 '{tool_name}' 缺少文档字符串，无法作为工具描述")
+        try:
+            inspect.signature(func)
+            get_type_hints(func)
+        except Exception as e:
+            logger.error("[%s] 无法解析函数工具 '%s' 的签名: %s", self.name, tool_name, e)
+            raise ValueError(f"无法解析函数工具 '{tool_name}' 的签名: {e}") from e
     
     def unregister_tool(self, name: str) -> bool:
         """注销工具
@@ -332,12 +506,11 @@ class BaseAgent(ABC):
         Returns:
             bool: 是否成功注销
         """
-        if name in self._tools:
-            del self._tools[name]
-            logger.info(f"[{self.name}] 注销工具: {name}")
+        if self._tools.pop(name, None) is not None:
+            logger.info("[%s] 注销工具: %s", self.name, name, extra={"agent": self.name, "tool": name})
             return True
         
-        logger.warning(f"[{self.name}] 工具 `{name}` 不存在，无法注销")
+        logger.warning("[%s] 工具 `%s` 不存在，无法注销", self.name, name)
         return False
     
     def get_tool(self, name: str) -> Optional[BaseTool]:
@@ -349,21 +522,35 @@ class BaseAgent(ABC):
         Returns:
             BaseTool 或 None（如果工具不存在）
         """
-        return self._tools.get(name)
+        tool = self._tools.get(name)
+        if tool is None or isinstance(tool, BaseTool):
+            return tool
+        
+        # 首次使用时转换并缓存，优先复用其他智能体已转换的同一函数
+        converted = self._shared_tools.get(id(tool))
+        if converted is None:
+            converted = StructuredTool.from_function(tool)
+            self._shared_tools[id(tool)] = converted
+        self._tools[name] = converted
+        return converted
     
     async def invoke_tool(
         self,
         name: str,
         *args,
+        use_cache: bool = True,
         **kwargs
     ) -> Any:
         """异步调用工具
         
-        使用异步方式调用指定工具，支持重试机制。
+        使用异步方式调用指定工具，支持超时控制；暂时性错误（见 RETRYABLE_ERRORS）按指数退避重试，
+        其他异常不重试，直接抛出 ToolExecutionError。
+        如果配置了缓存，相同参数的调用在有效期内直接返回缓存结果。
         
         Args:
             name: 工具名称
             *args: 位置参数
+            use_cache: 是否使用缓存，对有副作用或需要实时结果的调用可设为 False
             **kwargs: 关键字参数
         
         Returns:
@@ -373,50 +560,71 @@ class BaseAgent(ABC):
             ToolNotFoundError: 工具不存在
             ToolExecutionError: 工具执行失败
         """
-        tool = self.get_tool(name)
-        if not tool:
-            raise ToolNotFoundError(f"工具 '{name}' 未找到", agent_name=self.name)
-        
-        logger.debug(f"[{self.name}] 调用工具: {name}, args={args}, kwargs={kwargs}")
+        tool, cache_key, cached = self._begin_tool_call(name, args, kwargs, use_cache, "调用工具")
+        if cached is not AgentCache.MISSING:
+            return cached
         
         last_error = None  # 记录多次重试下的最后一个错误，用于异常抛出
+        attempt = -1  # max_retries 为 0 时不进入循环，尝试次数记为 0
         for attempt in range(self._max_retries):
             try:
-                result = await tool.ainvoke(*args, **kwargs)  # 异步调用工具
-                
-                if self._state.get("tools_output") is None:
-                    self._state["tools_output"] = {}
-                self._state["tools_output"][name] = result
-                
-                logger.debug(f"[{self.name}] 工具调用成功: {name}")
-                return result
-                
+                result = await asyncio.wait_for(tool.ainvoke(*args, **kwargs), timeout=self._timeout)  # 异步调用工具
             except Exception as e:
                 last_error = e
-                logger.warning(
-                    f"[{self.name}] 工具调用失败 (尝试 {attempt + 1}/{self._max_retries}): "
-                    f"{name}, 错误: {str(e)}"
-                )
+                if not self._on_tool_failure(name, attempt, e):
+                    break
+                await asyncio.sleep(self._retry_delay(attempt))
+                continue
+            # 写入发生在两次 await 之间，单线程事件循环下并发调用无需额外加锁
+            return self._finish_tool_call(name, result, cache_key)
+        
+        raise self._tool_execution_error(name, last_error, attempt + 1)
+    
+    async def invoke_tools_parallel(
+        self,
+        calls: List[Tuple[str, tuple, dict]]
+    ) -> List[Any]:
+        """并发调用多个工具
         
-        raise ToolExecutionError(
-            f"工具 '{name}' 执行失败，已重试 {self._max_retries} 次",
-            agent_name=self.name,
-            original_error=last_error
+        工具调用以 I/O 为主（HTTP/LLM 请求），并发执行后总耗时约为最慢一次调用的耗时，
+        而不是各次调用耗时之和。每个调用仍独立享有重试和超时机制。
+        如需进一步提升事件循环吞吐，可在进程启动时调用 ``uvloop.install()``。
+        
+        Args:
+            calls: 调用列表，每一项为 (工具名称, 位置参数元组, 关键字参数字典)
+        
+        Returns:
+            与 calls 顺序一致的结果列表；调用失败的位置为对应的异常实例
+            （ToolNotFoundError 或 ToolExecutionError），不会中断其他调用
+        
+        Example:
+            >>> results = await agent.invoke_tools_parallel([
+            ...     ("arxiv_search", ({"query": "LLM"},), {}),
+            ...     ("google_search", ({"query": "LLM"},), {}),
+            ... ])
+        """
+        return await asyncio.gather(
+            *(self.invoke_tool(name, *args, **kwargs) for name, args, kwargs in calls),
+            return_exceptions=True
         )
     
     def invoke_tool_sync(
         self,
         name: str,
         *args,
+        use_cache: bool = True,
         **kwargs
     ) -> Any:
         """同步调用工具
         
-        使用同步方式调用指定工具，支持重试机制。
+        使用同步方式调用指定工具，暂时性错误（见 RETRYABLE_ERRORS）按带抖动的指数退避重试，其他异常不重试。
+        如果配置了缓存，相同参数的调用在有效期内直接返回缓存结果。
+        注意：同步调用无法中断正在执行的工具，timeout 仅对异步调用 invoke_tool 生效。
         
         Args:
             name: 工具名称
             *args: 位置参数
+            use_cache: 是否使用缓存
             **kwargs: 关键字参数
         
         Returns:
@@ -426,56 +634,136 @@ class BaseAgent(ABC):
             ToolNotFoundError: 工具不存在
             ToolExecutionError: 工具执行失败
         """
-        tool = self.get_tool(name)
-        if not tool:
-            raise ToolNotFoundError(
-                f"工具 '{name}' 未找到",
-                agent_name=self.name
-            )
-        
-        logger.debug(f"[{self.name}] 同步调用工具: {name}, args={args}, kwargs={kwargs}")
+        tool, cache_key, cached = self._begin_tool_call(name, args, kwargs, use_cache, "同步调用工具")
+        if cached is not AgentCache.MISSING:
+            return cached
         
         last_error = None
+        attempt = -1
         for attempt in range(self._max_retries):
             try:
                 result = tool.invoke(*args, **kwargs)
-                
-                if self._state.get("tools_output") is None:
-                    self._state["tools_output"] = {}
-                self._state["tools_output"][name] = result
-                
-                logger.debug(f"[{self.name}] 工具调用成功: {name}")
-                return result
-                
             except Exception as e:
                 last_error = e
-                logger.warning(
-                    f"[{self.name}] 工具调用失败 (尝试 {attempt + 1}/{self._max_retries}): "
-                    f"{name}, 错误: {str(e)}"
-                )
+                if not self._on_tool_failure(name, attempt, e):
+                    break
+                time.sleep(self._retry_delay(attempt))
+                continue
+            return self._finish_tool_call(name, result, cache_key)
         
-        raise ToolExecutionError(
-            f"工具 '{name}' 执行失败，已重试 {self._max_retries} 次",
+        raise self._tool_execution_error(name, last_error, attempt + 1)
+    
+    # ---- invoke_tool / invoke_tool_sync 共用的步骤，两者只在调用工具和等待重试的方式上不同 ----
+    
+    def _begin_tool_call(
+        self,
+        name: str,
+        args: tuple,
+        kwargs: dict,
+        use_cache: bool,
+        action: str
+    ) -> Tuple[BaseTool, Optional[str], Any]:
+        """查找工具并检查缓存
+        
+        Returns:
+            (工具, 缓存键, 缓存结果)；未启用缓存时缓存键为 None，未命中时缓存结果为 AgentCache.MISSING
+        
+        Raises:
+            ToolNotFoundError: 工具不存在
+        """
+        tool = self.get_tool(name)
+        if not tool:
+            logger.error("[%s] 工具 '%s' 未找到", self.name, name, extra={"agent": self.name, "tool": name})
+            raise ToolNotFoundError(f"工具 '{name}' 未找到", agent_name=self.name)
+        
+        logger.debug("[%s] %s: %s, args=%s, kwargs=%s", self.name, action, name, args, kwargs, extra={"agent": self.name, "tool": name})
+        
+        cache_key = self._tool_cache_key(name, args, kwargs) if use_cache else None
+        if cache_key is None:
+            return tool, None, AgentCache.MISSING
+        
+        cached = self._cache.get(cache_key)
+        if cached is not AgentCache.MISSING:
+            self._state.setdefault("tools_output", {})[name] = cached
+            logger.debug("[%s] 工具调用命中缓存: %s", self.name, name, extra={"agent": self.name, "tool": name, "cache_hit": True})
+        return tool, cache_key, cached
+    
+    def _finish_tool_call(self, name: str, result: Any, cache_key: Optional[str]) -> Any:
+        """记录工具调用成功的结果：写入 tools_output 和缓存"""
+        self._state.setdefault("tools_output", {})[name] = result
+        if cache_key is not None:
+            self._cache.set(cache_key, result)
+        
+        logger.debug("[%s] 工具调用成功: %s", self.name, name, extra={"agent": self.name, "tool": name})
+        return result
+    
+    def _on_tool_failure(self, name: str, attempt: int, error: Exception) -> bool:
+        """记录一次失败的工具调用
+        
+        Returns:
+            bool: 是否继续重试；错误不属于 RETRYABLE_ERRORS 或重试次数已用完时返回 False
+        """
+        logger.warning(
+            "[%s] 工具调用失败 (尝试 %d/%d): %s, 错误: %s",
+            self.name, attempt + 1, self._max_retries, name, error,
+            extra={"agent": self.name, "tool": name, "attempt": attempt + 1}
+        )
+        return isinstance(error, self.RETRYABLE_ERRORS) and attempt + 1 < self._max_retries
+    
+    def _tool_execution_error(self, name: str, last_error: Optional[Exception], attempts: int) -> ToolExecutionError:
+        """记录并构造停止重试后抛出的 ToolExecutionError"""
+        logger.error(
+            "[%s] 工具 '%s' 执行失败，共尝试 %d 次 | 原因: %s",
+            self.name, name, attempts, last_error,
+            extra={"agent": self.name, "tool": name}
+        )
+        return ToolExecutionError(
+            f"工具 '{name}' 执行失败，共尝试 {attempts} 次",
             agent_name=self.name,
             original_error=last_error
         )
     
+    def _retry_delay(self, attempt: int) -> float:
+        """计算第 attempt 次失败后的退避时间（秒）
+        
+        基础时间为 RETRY_BACKOFF * 2^attempt，上限 RETRY_BACKOFF_MAX；
+        实际等待时间在基础时间的一半到全部之间随机取值，避免多个调用方同时重试。
+        """
+        delay = min(self.RETRY_BACKOFF_MAX, self.RETRY_BACKOFF * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+    
+    def _tool_cache_key(self, name: str, args: tuple, kwargs: dict) -> Optional[str]:
+        """生成工具调用的缓存键，未配置缓存或参数无法序列化时返回 None
+        
+        键中包含工具的注册版本，同名工具被覆盖后不会命中旧工具的结果；
+        首次注册的版本均为 0，共享缓存的多个智能体注册同一工具时仍可互相命中。
+        """
+        if self._cache is None:
+            return None
+        return AgentCache.make_key(self._system_prompt, name, self._tool_versions.get(name, 0), args, kwargs)
+    
     def add_message(self, message: BaseMessage) -> None:
         """添加消息到消息历史
         
         Args:
             message: 消息实例（BaseMessage 子类）
         """
-        if self._state.get("messages") is None:
-            self._state["messages"] = []
-        self._state["messages"].append(message)
+        messages = self._state.get("messages")
+        if messages is None:  # 不用 setdefault，避免每次都构造一个用不上的列表
+            messages = self._state["messages"] = self._new_message_history()
+        messages.append(message)
+        if isinstance(message, SystemMessage):
+            self._system_msg_count += 1
+        if len(messages) > settings.max_message_history:
+            self._trim_message_history(messages)
 
-        message_view = f"content='{message.content[:50]}...', " if len(str(message.content)) > 50 else f"content='{message.content}', "
-        logger.debug(
-            f"[{self.name}] 添加消息: type={type(message).__name__}, "
-            f"{message_view}"  # 预览前50个字符
-            f"content_length={len(str(message.content))}" 
-        )
+        # 预览内容需要切片和多次 str()，仅在 DEBUG 级别开启时计算
+        if logger.isEnabledFor(logging.DEBUG):
+            content = message.content if type(message.content) is str else str(message.content)
+            logger.debug(
+                "[%s] 添加消息: type=%s, content='%s', content_length=%d",  # 预览前50个字符
+                self.name, type(message).__name__, _preview(content), len(content)
+            )
     
     def add_system_message(self, content: str) -> None:
         """添加系统消息
@@ -521,26 +809,39 @@ class BaseAgent(ABC):
             include_system: 是否包含系统消息
         
         Returns:
-            消息列表
+            消息历史列表；include_system=False 且存在系统消息时返回过滤后的新列表，
+            否则直接返回内部存储的列表，不做复制（只读，调用方不应修改，需要修改时请自行 list() 复制）
+        
+        Note:
+            系统消息计数由 add_message/update_state 维护，
+            直接修改 state["messages"] 添加的 SystemMessage 不会被计入。
         """
-        messages = self._state.get("messages", [])
-        if not include_system:
+        messages = self._state.get("messages")
+        if messages is None:
+            return []
+        if not include_system and self._system_msg_count:
             return [m for m in messages if not isinstance(m, SystemMessage)]
         return messages
     
+    def _recount_system_messages(self) -> None:
+        """消息历史被整体替换后重新统计系统消息数量"""
+        messages = self._state.get("messages", _EMPTY_MESSAGES)
+        self._system_msg_count = sum(1 for m in messages if isinstance(m, SystemMessage))
+    
     def get_last_message(self) -> Optional[BaseMessage]:
         """获取最后一条消息
         
         Returns:
             最后一条消息或 None（如果消息历史为空）
         """
-        messages = self._state.get("messages", [])
+        messages = self._state.get("messages", _EMPTY_MESSAGES)
         return messages[-1] if messages else None
     
     def clear_messages(self) -> None:
         """清空消息历史"""
-        self._state["messages"] = []
-        logger.debug(f"[{self.name}] 消息历史已清空")
+        self._state["messages"] = self._new_message_history()
+        self._system_msg_count = 0
+        logger.debug("[%s] 消息历史已清空", self.name)
     
     def set_error(self, error: str, exception: Optional[Exception] = None) -> None:
         """设置错误信息
@@ -555,9 +856,11 @@ class BaseAgent(ABC):
         self._state["status"] = AgentStatus.FAILED
         
         if exception:
-            logger.error(f"[{self.name}] 发生错误: {error}", exc_info=exception)
+            logger.error("[%s] 发生错误: %s", self.name, error, exc_info=exception)
         else:
-            logger.error(f"[{self.name}] 发生错误: {error}")
+            logger.error("[%s] 发生错误: %s", self.name, error)
+        
+        self._auto_checkpoint()
     
     def set_context(self, key: str, value: Any) -> None:
         """设置上下文信息
@@ -568,10 +871,8 @@ class BaseAgent(ABC):
             key: 键名
             value: 值（可以是任意类型）
         """
-        if self._state.get("context") is None:
-            self._state["context"] = {}
-        self._state["context"][key] = value
-        logger.debug(f"[{self.name}] 设置上下文: {key}")
+        self._state.setdefault("context", {})[key] = value
+        logger.debug("[%s] 设置上下文: %s", self.name, key)
     
     def get_context(self, key: str, default: Any = None) -> Any:
         """获取上下文信息
@@ -583,7 +884,7 @@ class BaseAgent(ABC):
         Returns:
             上下文值或默认值
         """
-        context = self._state.get("context", {})
+        context = self._state.get("context", _EMPTY_MAPPING)
         return context.get(key, default)
     
     def set_metadata(self, key: str, value: Any) -> None:
@@ -595,10 +896,8 @@ class BaseAgent(ABC):
             key: 键名
             value: 值
         """
-        if self._state.get("metadata") is None:
-            self._state["metadata"] = {}
-        self._state["metadata"][key] = value
-        logger.debug(f"[{self.name}] 设置元数据: {key}:{value}")
+        self._state.setdefault("metadata", {})[key] = value
+        logger.debug("[%s] 设置元数据: %s:%s", self.name, key, value)
     
     def get_metadata(self, key: str, default: Any = None) -> Any:
         """获取元数据
@@ -610,9 +909,126 @@ class BaseAgent(ABC):
         Returns:
             元数据值或默认值
         """
-        metadata = self._state.get("metadata", {})
+        metadata = self._state.get("metadata", _EMPTY_MAPPING)
         return metadata.get(key, default)
     
+    def save_checkpoint(self, key: Optional[str] = None) -> bool:
+        """将当前状态保存为检查点
+        
+        Args:
+            key: 检查点键，默认使用 metadata 中的 task_id
+        
+        Returns:
+            bool: 是否保存成功（未配置检查点存储或没有可用的键时返回 False）
+        
+        Note:
+            同步写入 SQLite，在异步代码中调用会阻塞事件循环直到写入完成，
+            可改用 ``await asyncio.to_thread(agent.save_checkpoint)``。
+            无法序列化的状态字段会被跳过，见 _serialize_state。
+        """
+        key = key or self.get_metadata("task_id")
+        if self._checkpointer is None or not key:
+            logger.warning("[%s] 未配置检查点存储或缺少 task_id，跳过保存检查点", self.name)
+            return False
+        
+        self._checkpointer.save(key, self._serialize_state())
+        logger.info("[%s] 已保存检查点: %s", self.name, key)
+        return True
+    
+    def _serialize_state(self) -> bytes:
+        """将当前状态序列化为检查点数据
+        
+        无法序列化的字段（如其中包含任意 Python 对象）记录警告后整体跳过，
+        恢复时该字段使用初始值，而不是被替换成对象的字符串形式。
+        
+        Returns:
+            JSON 字节串
+        """
+        state = self._state
+        try:
+            return orjson.dumps(state, default=_state_default)
+        except TypeError:
+            pass  # 退回逐字段序列化，只跳过有问题的字段
+        
+        parts = []
+        for field, value in state.items():
+            try:
+                parts.append(orjson.dumps(field) + b":" + orjson.dumps(value, default=_state_default))
+            except TypeError as e:
+                logger.warning("[%s] 状态字段 %s 无法序列化，检查点中跳过该字段: %s", self.name, field, e)
+        return b"{" + b",".join(parts) + b"}"
+    
+    def load_checkpoint(self, key: Optional[str] = None) -> bool:
+        """从检查点恢复状态
+        
+        检查点中没有的字段使用初始值，消息历史按 max_message_history 截断。
+        
+        Args:
+            key: 检查点键，默认使用 metadata 中的 task_id
+        
+        Returns:
+            bool: 是否恢复成功（未配置检查点存储、缺少键或检查点不存在时返回 False）
+        """
+        key = key or self.get_metadata("task_id")
+        data = self._checkpointer.load(key) if self._checkpointer is not None and key else None
+        if data is None:
+            logger.warning("[%s] 未找到检查点: %s", self.name, key)
+            return False
+        
+        saved = orjson.loads(data)
+        state = self._init_state()
+        for field, value in saved.items():
+            if field in _ALLOWED_STATE_KEYS:
+                state[field] = value
+        state["messages"] = messages_from_dict(saved.get("messages") or [])
+        self._trim_message_history(state["messages"])
+        state["status"] = AgentStatus(state["status"])
+        self._state = state
+        self._recount_system_messages()
+        
+        logger.info("[%s] 已从检查点恢复状态: %s", self.name, key)
+        return True
+    
+    def _auto_checkpoint(self) -> None:
+        """状态进入终止状态时自动保存检查点（仅在配置了检查点存储时生效）
+        
+        在事件循环中调用时（如异步智能体的 run() 内），状态在当前线程序列化为快照，
+        SQLite 写入交给后台线程执行，不阻塞事件循环；可通过 wait_for_checkpoints() 等待写入完成。
+        没有事件循环时同步写入。
+        """
+        if self._checkpointer is None:
+            return
+        key = self.get_metadata("task_id")
+        if not key:
+            # 不是每个智能体都按任务保存检查点，每次进入终止状态都告警只会产生噪音
+            logger.debug("[%s] 缺少 task_id，跳过自动保存检查点", self.name)
+            return
+        
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save_checkpoint(key)
+            return
+        
+        future = loop.run_in_executor(_CHECKPOINT_EXECUTOR, self._checkpointer.save, key, self._serialize_state())
+        self._pending_checkpoints.add(future)
+        future.add_done_callback(partial(self._on_checkpoint_saved, key))
+    
+    def _on_checkpoint_saved(self, key: str, future: "asyncio.Future[None]") -> None:
+        """后台检查点写入完成后的回调：记录结果并移出待完成集合"""
+        self._pending_checkpoints.discard(future)
+        if future.cancelled():
+            logger.warning("[%s] 检查点写入被取消: %s", self.name, key)
+        elif future.exception() is not None:
+            logger.error("[%s] 保存检查点失败: %s", self.name, key, exc_info=future.exception())
+        else:
+            logger.info("[%s] 已保存检查点: %s", self.name, key)
+    
+    async def wait_for_checkpoints(self) -> None:
+        """等待所有后台检查点写入完成（如在进程退出或读取检查点之前调用）"""
+        if self._pending_checkpoints:
+            await asyncio.gather(*self._pending_checkpoints, return_exceptions=True)
+    
     def prepare_messages_for_llm(self) -> List[BaseMessage]:
         """准备发送给 LLM 的消息列表
         
@@ -621,20 +1037,14 @@ class BaseAgent(ABC):
         Returns:
             准备好的消息列表，可直接传递给 LLM
         """
-        messages = []
-        
-        if self._system_prompt:
-            messages.append(SystemMessage(content=self._system_prompt))
-        
-        existing_messages = self._state.get("messages", [])
-        messages.extend(existing_messages)
+        existing_messages = self._state.get("messages", _EMPTY_MESSAGES)
+        messages = [self._system_message, *existing_messages] if self._system_message else list(existing_messages)
         
-        messages_view = f'{messages[:10]}' if len(messages) > 10 else messages
-        
-        logger.debug(
-            f"[{self.name}] 准备 LLM 消息: messages={messages_view}, "
-            f"with_system={bool(self._system_prompt)}"
-        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "[%s] 准备 LLM 消息: messages=%s, with_system=%s",
+                self.name, messages[:10] if len(messages) > 10 else messages, self._system_message is not None
+            )
         
         return messages
     
@@ -649,12 +1059,10 @@ class BaseAgent(ABC):
         return {
             "name": self.name,
             "status": self._state.get("status"),
-            "message_count": len(self._state.get("messages", [])),
+            "message_count": len(self._state.get("messages", _EMPTY_MESSAGES)),
             "tool_count": len(self._tools),
             "has_error": bool(self._state.get("error")),
-            "current_task": self._state.get("current_task", "")[:50] + "..."
-            if len(self._state.get("current_task", "")) > 50
-            else self._state.get("current_task", "")
+            "current_task": _preview(self._state.get("current_task", ""))
         }
     
     @abstractmethod
@@ -0,0 +1,110 @@
+"""ResGenie 智能体缓存模块
+
+该模块提供智能体级别的结果缓存：
+- 进程内 LRU + TTL 缓存，相同的工具调用在有效期内直接返回缓存结果
+- 缓存键由系统提示词、工具名称、工具注册版本和调用参数的哈希生成
+"""
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from ..core.config import settings
+from ..core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_MISSING = object()  # 缓存未命中标记，区分“未命中”和“缓存值为 None”
+
+class AgentCache:
+    """进程内 LRU + TTL 缓存
+
+    超过 max_size 时淘汰最久未使用的条目，超过 ttl 的条目在读取时失效。
+    可在多个智能体之间共享同一个实例。
+
+    Attributes:
+        max_size: 最大缓存条目数
+        ttl: 缓存过期时间（秒）
+
+    Example:
+        >>> cache = AgentCache(max_size=256, ttl=600)
+        >>> agent = MyAgent(tools=[search], cache=cache)
+        >>> await agent.invoke_tool("search", {"query": "LLM"})  # 实际调用
+        >>> await agent.invoke_tool("search", {"query": "LLM"})  # 命中缓存
+    """
+
+    MISSING = _MISSING
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None):
+        """初始化缓存
+
+        Args:
+            max_size: 最大缓存条目数，默认从配置读取
+            ttl: 缓存过期时间（秒），默认从配置读取
+        """
+        self.max_size = max_size if max_size is not None else settings.cache_max_size
+        self.ttl = ttl if ttl is not None else settings.cache_ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts: Any) -> Optional[str]:
+        """根据调用信息生成缓存键
+
+        Args:
+            *parts: 参与计算缓存键的对象（系统提示词、工具名称、工具版本、参数等）
+
+        Returns:
+            缓存键；参数无法序列化时返回 None，表示该次调用不缓存
+        """
+        try:
+            payload = pickle.dumps(parts, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return None
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Any:
+        """读取缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存值；未命中或已过期时返回 AgentCache.MISSING
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """写入缓存
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 本条目的过期时间（秒），默认使用实例的 ttl
+        """
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+        logger.debug("智能体缓存已清空")
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -1,10 +1,23 @@
 """ResGenie 核心模块"""
 from .config import settings, get_settings
-from .database import (
-    engine, SessionLocal, _get_database_url, get_db, get_db_context, init_db, drop_db, 
-    reset_db, get_engine_info, check_connection, close_all_connections
-)
 from .logging import get_logger, init_logging, set_log_level, LogContext, log_function_call, log_exception
+from .checkpoint import Checkpointer
+
+# 数据库相关对象在首次访问时才导入：导入 database 会创建引擎并加载 SQLAlchemy 和 asyncpg，
+# 只用到配置、日志或检查点的模块（如智能体）无需承担这部分开销
+_DATABASE_EXPORTS = frozenset({
+    "engine", "SessionLocal", "_get_database_url", "get_db", "get_db_context", "init_db", "drop_db",
+    "reset_db", "get_engine_info", "check_connection", "close_all_connections",
+    "async_engine", "AsyncSessionLocal", "get_async_db",
+})
+
+def __getattr__(name: str):
+    if name in _DATABASE_EXPORTS:
+        from . import database
+        value = getattr(database, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 __all__ = [
     # 配置相关
@@ -12,7 +25,10 @@ __all__ = [
     # 数据库相关
     "engine", "SessionLocal", "_get_database_url", "get_db", "get_db_context", "init_db", "drop_db", 
     "reset_db", "get_engine_info", "check_connection", "close_all_connections",
+    "async_engine", "AsyncSessionLocal", "get_async_db",
     # 日志相关
     "get_logger", "init_logging", "set_log_level",
-    "LogContext", "log_function_call", "log_exception"
+    "LogContext", "log_function_call", "log_exception",
+    # 检查点相关
+    "Checkpointer"
 ]
@@ -0,0 +1,92 @@
+"""ResGenie 检查点模块
+
+该模块提供基于 SQLite 的状态检查点存储：
+- 使用 WAL 模式，写检查点不会阻塞并发读取
+- 以任务 ID 等字符串为键，保存序列化后的状态字节
+- 供智能体在中断或崩溃后从最近的检查点恢复，避免从头重新计算
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from .config import settings
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+class Checkpointer:
+    """SQLite 检查点存储
+
+    只负责按键存取字节数据，状态的序列化格式由调用方决定。
+    同一实例可在多个智能体、多个线程之间共享。
+
+    Attributes:
+        path: SQLite 数据库文件路径
+
+    Example:
+        >>> checkpointer = Checkpointer("./data/checkpoints.db")
+        >>> checkpointer.save("task-1", b'{"status": "running"}')
+        >>> checkpointer.load("task-1")
+        b'{"status": "running"}'
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """初始化检查点存储，数据库和表不存在时自动创建
+
+        Args:
+            path: SQLite 数据库文件路径，默认从配置读取；":memory:" 表示使用内存数据库
+        """
+        self.path = path or settings.checkpoint_path
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        # autocommit 模式，每次写入即提交；连接由多个线程共享，访问时加锁
+        self._conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # WAL 下 NORMAL 已能保证一致性，写入更快
+        self._conn.execute("CREATE TABLE IF NOT EXISTS ckpt(key TEXT PRIMARY KEY, state BLOB, ts REAL)")
+        self._lock = threading.Lock()
+        logger.debug("检查点存储已打开: %s", self.path)
+
+    def save(self, key: str, state: bytes) -> None:
+        """保存检查点，已存在的同键检查点会被覆盖
+
+        Args:
+            key: 检查点键（通常为任务 ID）
+            state: 序列化后的状态
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ckpt(key, state, ts) VALUES (?, ?, ?)",
+                (key, state, time.time())
+            )
+
+    def load(self, key: str) -> Optional[bytes]:
+        """读取检查点
+
+        Args:
+            key: 检查点键
+
+        Returns:
+            序列化后的状态；不存在时返回 None
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM ckpt WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def delete(self, key: str) -> None:
+        """删除检查点
+
+        Args:
+            key: 检查点键
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM ckpt WHERE key = ?", (key,))
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+        logger.debug("检查点存储已关闭: %s", self.path)
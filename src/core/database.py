@@ -1,9 +1,14 @@
 """数据库连接和初始化模块"""
-from typing import Generator
+import logging
+import os
+from functools import lru_cache
+from typing import AsyncGenerator, Generator, Optional
 from contextlib import contextmanager
-from sqlalchemy import create_engine, event, inspect
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+
+import orjson
+from sqlalchemy import create_engine, event, inspect, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase, sessionmaker, Session
 from sqlalchemy.exc import SQLAlchemyError
 
 from .config import settings
@@ -12,8 +17,9 @@ from .logging import get_logger
 logger = get_logger(__name__)
 
 # 根据环境选择数据库URL
+@lru_cache(maxsize=None)
 def _get_database_url() -> str:
-    """根据环境获取数据库URL"""
+    """根据环境获取数据库URL（结果缓存，运行环境在进程内不变）"""
     env = settings.resgenie_env
     if env == "development":
         return settings.dev_database_url
@@ -24,40 +30,112 @@ def _get_database_url() -> str:
     else:
         return settings.dev_database_url
 
+def _get_async_database_url(url: Optional[str] = None) -> Optional[str]:
+    """获取异步驱动（asyncpg）使用的数据库URL
+    
+    Args:
+        url: 同步数据库URL，默认使用当前环境的URL
+    
+    Returns:
+        将驱动替换为 asyncpg 后的URL（如 postgresql+psycopg2:// -> postgresql+asyncpg://）；
+        非 PostgreSQL 数据库（如 sqlite）没有对应的异步驱动，返回 None
+    """
+    parsed = make_url(url or _get_database_url())
+    if parsed.get_backend_name() != "postgresql":
+        return None
+    return parsed.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+def _get_pool_size() -> int:
+    """获取每个进程的连接池大小：优先使用配置，未配置时按 CPU 核数设置（至少 4）"""
+    if settings.db_pool_size:
+        return settings.db_pool_size
+    return max(4, os.cpu_count() or 4)
+
+# 多进程部署时总连接数约为 进程数 × (pool_size + max_overflow)，需低于数据库的 max_connections
+_POOL_SIZE = _get_pool_size()
+_POOL_RESET_ON_RETURN = settings.db_pool_reset_on_return or None
+
+# 编译后 SQL 的缓存条目数（SQLAlchemy 默认 500）。5 个模型的增删改查加上不同过滤条件组合会超出默认值，
+# 缓存被挤出后同一语句需要重新编译
+_QUERY_CACHE_SIZE = 2000
+# asyncpg 每个连接上缓存的预编译语句数（两者默认均为 100），重复查询无需再向服务端发送 Parse
+_STATEMENT_CACHE_SIZE = 1024
+
+def _json_serializer(value) -> str:
+    """JSON/JSONB 列的序列化函数，使用 orjson 替代标准库 json（允许非字符串键，与 json.dumps 行为一致）"""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+
 # 创建数据库引擎
 engine = create_engine(
     _get_database_url(),
     pool_pre_ping=True,           # 连接池预ping，确保连接有效
-    pool_size=10,                 # 连接池大小
-    max_overflow=20,              # 最大溢出连接数
+    pool_size=_POOL_SIZE,         # 连接池大小
+    max_overflow=settings.db_max_overflow,  # 最大溢出连接数
+    pool_reset_on_return=_POOL_RESET_ON_RETURN,  # 连接归还时的重置方式
     pool_timeout=30,              # 获取连接超时时间（秒）
     pool_recycle=3600,            # 连接回收时间（秒），1小时后回收连接
     pool_use_lifo=True,           # 使用LIFO策略，优先使用最近使用的连接
     echo=False,                   # 不输出SQL日志
     echo_pool=False,              # 不输出连接池日志
+    query_cache_size=_QUERY_CACHE_SIZE,  # 编译后 SQL 的缓存大小
+    json_serializer=_json_serializer,   # JSON 列使用 orjson 序列化
+    json_deserializer=orjson.loads,     # JSON 列使用 orjson 反序列化
     connect_args={
         "connect_timeout": 20,    # 连接超时时间
         "options": "-c timezone=utc",  # 使用UTC时区
     } if settings.resgenie_env == "production" else {}
 )
 
-# 添加连接池事件监听器
-@event.listens_for(engine, "connect")
+# 创建异步数据库引擎，供异步请求处理使用，等待数据库返回期间不占用线程；
+# 同步引擎保留给迁移、脚本等场景。只有 PostgreSQL 有异步驱动，其他数据库不创建异步引擎，
+# 同步路径（init_db、模型、get_db）不受影响
+_ASYNC_DATABASE_URL = _get_async_database_url()
+async_engine: Optional[AsyncEngine] = create_async_engine(
+    _ASYNC_DATABASE_URL,
+    pool_pre_ping=True,           # 连接池预ping，确保连接有效
+    pool_size=_POOL_SIZE,         # 连接池大小
+    max_overflow=settings.db_max_overflow,  # 最大溢出连接数
+    pool_reset_on_return=_POOL_RESET_ON_RETURN,  # 连接归还时的重置方式
+    pool_timeout=30,              # 获取连接超时时间（秒）
+    pool_recycle=3600,            # 连接回收时间（秒），1小时后回收连接
+    pool_use_lifo=True,           # 使用LIFO策略，优先使用最近使用的连接
+    echo=False,                   # 不输出SQL日志
+    query_cache_size=_QUERY_CACHE_SIZE,  # 编译后 SQL 的缓存大小
+    json_serializer=_json_serializer,   # JSON 列使用 orjson 序列化
+    json_deserializer=orjson.loads,     # JSON 列使用 orjson 反序列化
+    connect_args={
+        "statement_cache_size": _STATEMENT_CACHE_SIZE,           # asyncpg 连接内的语句缓存
+        "prepared_statement_cache_size": _STATEMENT_CACHE_SIZE,  # SQLAlchemy asyncpg 适配层的预编译语句缓存
+        **({
+            "timeout": 20,                              # 连接超时时间（asyncpg 参数名）
+            "server_settings": {"timezone": "utc"},     # 使用UTC时区
+        } if settings.resgenie_env == "production" else {}),
+    }
+) if _ASYNC_DATABASE_URL is not None else None
+
+# 连接池事件监听器
 def receive_connect(dbapi_conn, connection_record):
     """连接建立时的回调"""
     logger.debug("数据库连接已建立")
 
-@event.listens_for(engine, "checkout")
 def receive_checkout(dbapi_conn, connection_record, connection_proxy):
     """从连接池获取连接时的回调"""
     logger.debug("从连接池获取连接")
 
-@event.listens_for(engine, "checkin")
 def receive_checkin(dbapi_conn, connection_record):
     """连接归还到连接池时的回调"""
     logger.debug("连接归还到连接池")
 
-# 创建数据库会话工厂
+# 每次获取/归还连接都会触发回调，仅在导入时日志级别为 DEBUG 的情况下注册，
+# 避免非调试环境中每个请求都经过一次只会被丢弃的日志调用
+if logger.isEnabledFor(logging.DEBUG):
+    event.listen(engine, "connect", receive_connect)
+    event.listen(engine, "checkout", receive_checkout)
+    event.listen(engine, "checkin", receive_checkin)
+
+# 创建数据库会话工厂：每次调用返回一个新的 Session。
+# Session 不是线程安全的，不使用按线程复用的 scoped_session：FastAPI 在线程池中执行同步依赖，
+# 同一线程会先后服务多个仍在进行中的请求，按线程复用会让这些请求共享同一个 Session
 SessionLocal = sessionmaker(
     autocommit=False, 
     autoflush=False, 
@@ -65,23 +143,28 @@ SessionLocal = sessionmaker(
     expire_on_commit=False  # 提交后不使对象过期，减少查询
 )
 
-# 定义数据库模型的基类
-Base = declarative_base()
+# 创建异步数据库会话工厂（没有异步引擎时为 None）
+AsyncSessionLocal: Optional["async_sessionmaker[AsyncSession]"] = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False  # 提交后不使对象过期，异步会话中访问过期属性会触发隐式 I/O 报错
+) if async_engine is not None else None
 
-# 懒加载模型导入（避免循环依赖）
-_models_imported = False
+# 定义数据库模型的基类（SQLAlchemy 2.0 声明式，配合 Mapped[...] 类型注解使用）
+class Base(DeclarativeBase):
+    pass
 
+# 懒加载模型导入（避免循环依赖）
+@lru_cache(maxsize=None)
 def _ensure_models_imported():
-    """确保所有模型已导入并注册"""
-    global _models_imported
-    if not _models_imported:
-        try:
-            from ..models import User, ResearchTask, Document, AgentExecution, Report
-            _models_imported = True
-            logger.debug("数据库模型已导入")
-        except ImportError as e:
-            logger.error(f"导入数据库模型失败: {e}")
-            raise
+    """确保所有模型已导入并注册（只在首次成功时执行，导入失败不会被缓存）"""
+    try:
+        from ..models import User, ResearchTask, Document, AgentExecution, Report
+        logger.debug("数据库模型已导入")
+    except ImportError as e:
+        logger.error("导入数据库模型失败: %s", e)
+        raise
 
 def get_db() -> Generator[Session, None, None]:
     """
@@ -92,7 +175,7 @@ def get_db() -> Generator[Session, None, None]:
     
     特点：
     - 不自动提交事务，需要手动调用 db.commit()
-    - 异常时自动回滚事务
+    - 会话关闭时自动回滚未提交的事务（包括异常情况）
     - 确保会话被正确关闭
     
     Yields:
@@ -104,24 +187,37 @@ def get_db() -> Generator[Session, None, None]:
         def get_users(db: Session = Depends(get_db)):
             return db.query(User).all()
     """
+    # 每个请求使用新的 Session；Session.close() 会回滚未提交的事务并归还连接，
+    # 异常由 FastAPI 等调用方处理，无需在此捕获
     db = SessionLocal()
     try:
-        logger.debug("数据库会话已创建")
         yield db
-    except SQLAlchemyError as e:
-        logger.error(f"数据库操作错误: {e}")
-        db.rollback()
-        raise
-    except Exception as e:
-        logger.error(f"未知错误: {e}")
-        db.rollback()
-        raise
     finally:
-        try:
-            db.close()
-            logger.debug("数据库会话已关闭")
-        except Exception as e:
-            logger.error(f"关闭数据库会话时出错: {e}")
+        db.close()
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    异步数据库会话生成器，用于异步依赖注入场景。
+    
+    与 get_db() 相同，不自动提交事务，会话关闭时回滚未提交的事务。
+    
+    Yields:
+        AsyncSession: 异步数据库会话对象
+    
+    Raises:
+        RuntimeError: 当前数据库没有异步驱动（非 PostgreSQL）时抛出
+        
+    Example:
+        # FastAPI 依赖注入
+        @app.get("/users")
+        async def get_users(db: AsyncSession = Depends(get_async_db)):
+            result = await db.execute(select(User))
+            return result.scalars().all()
+    """
+    if AsyncSessionLocal is None:
+        raise RuntimeError(f"数据库 {make_url(_get_database_url()).get_backend_name()} 不支持异步会话，请使用 get_db()")
+    async with AsyncSessionLocal() as db:
+        yield db
 
 @contextmanager
 def get_db_context():
@@ -132,28 +228,20 @@ def get_db_context():
         with get_db_context() as db:
             db.execute("SELECT * FROM users")
     
+    该上下文使用独立的会话，嵌套在 get_db() 中使用时，提交或回滚不会影响外层会话。
+    
     Yields:
         Session: 数据库会话对象
     """
     db = SessionLocal()
     try:
-        logger.debug("数据库会话已创建")
         yield db
         db.commit()
-    except SQLAlchemyError as e:
-        logger.error(f"数据库操作错误: {e}")
-        db.rollback()
-        raise
-    except Exception as e:
-        logger.error(f"未知错误: {e}")
+    except BaseException:
         db.rollback()
         raise
     finally:
-        try:
-            db.close()
-            logger.debug("数据库会话已关闭")
-        except Exception as e:
-            logger.error(f"关闭数据库会话时出错: {e}")
+        db.close()
 
 def init_db() -> None:
     """
@@ -166,19 +254,27 @@ def init_db() -> None:
         logger.info("开始初始化数据库...")
         # 确保模型已导入
         _ensure_models_imported()
-        # 创建所有表
-        Base.metadata.create_all(bind=engine, checkfirst=True)
+        with engine.begin() as conn:
+            # 一次查询取得已存在的表，只创建缺失的表；checkfirst=True 会为每张表各查询一次系统表
+            existing = set(inspect(conn).get_table_names())
+            missing = [table for table in Base.metadata.sorted_tables if table.name not in existing]
+            Base.metadata.create_all(bind=conn, tables=missing, checkfirst=False)
         # 显示已创建的表
-        inspector = inspect(engine)
-        tables = inspector.get_table_names()
-        logger.info(f"数据库初始化成功，已创建表: {tables}")
+        tables = sorted(existing.union(table.name for table in missing))
+        logger.info("数据库初始化成功，已创建表: %s", tables)
     except SQLAlchemyError as e:
-        logger.error(f"数据库初始化失败: {e}")
+        logger.error("数据库初始化失败: %s", e)
         raise
     except Exception as e:
-        logger.error(f"初始化数据库时发生未知错误: {e}")
+        logger.error("初始化数据库时发生未知错误: %s", e)
         raise
 
+def _drop_existing_tables(conn) -> None:
+    """在给定连接上删除模型对应且已存在的表（一次查询系统表，避免 checkfirst=True 逐表查询）"""
+    existing = set(inspect(conn).get_table_names())
+    tables = [table for table in Base.metadata.sorted_tables if table.name in existing]
+    Base.metadata.drop_all(bind=conn, tables=tables, checkfirst=False)
+
 def drop_db() -> None:
     """
     删除所有表（仅用于测试）
@@ -195,13 +291,14 @@ def drop_db() -> None:
         # 确保模型已导入
         _ensure_models_imported()
         # 删除所有表
-        Base.metadata.drop_all(bind=engine)
+        with engine.begin() as conn:
+            _drop_existing_tables(conn)
         logger.warning("数据库表已删除")
     except SQLAlchemyError as e:
-        logger.error(f"删除数据库表失败: {e}")
+        logger.error("删除数据库表失败: %s", e)
         raise
     except Exception as e:
-        logger.error(f"删除数据库表时发生未知错误: {e}")
+        logger.error("删除数据库表时发生未知错误: %s", e)
         raise
 
 def reset_db() -> None:
@@ -218,11 +315,14 @@ def reset_db() -> None:
     
     try:
         logger.info("开始重置数据库...")
-        drop_db()
-        init_db()
+        _ensure_models_imported()
+        # 删表和建表在同一个事务中完成，只提交一次；删除后所有表都不存在，建表无需再检查
+        with engine.begin() as conn:
+            _drop_existing_tables(conn)
+            Base.metadata.create_all(bind=conn, checkfirst=False)
         logger.info("数据库重置成功")
     except Exception as e:
-        logger.error(f"重置数据库失败: {e}")
+        logger.error("重置数据库失败: %s", e)
         raise
 
 def get_engine_info() -> dict:
@@ -255,12 +355,11 @@ def check_connection() -> bool:
         bool: 连接正常返回True，否则返回False
     """
     try:
-        from sqlalchemy import text
+        # 直接用方言的 ping 检查底层 DBAPI 连接，不经过 SQL 文本的构造、编译和结果集封装
         with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        return True
+            return engine.dialect.do_ping(conn.connection.dbapi_connection)
     except Exception as e:
-        logger.error(f"数据库连接检查失败: {e}")
+        logger.error("数据库连接检查失败: %s", e)
         return False
 
 def close_all_connections() -> None:
@@ -272,5 +371,5 @@ def close_all_connections() -> None:
         engine.dispose()
         logger.info("所有数据库连接已关闭")
     except Exception as e:
-        logger.error(f"关闭数据库连接时出错: {e}")
+        logger.error("关闭数据库连接时出错: %s", e)
         raise
@@ -1,9 +1,13 @@
 """ResGenie 日志系统模块"""
+import atexit
 import logging
+import queue
 import sys
 from pathlib import Path
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
-from typing import Optional
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from typing import Dict, Optional
+
+import orjson
 
 from .config import settings
 
@@ -19,11 +23,20 @@ class ColoredFormatter(logging.Formatter):
     }
     RESET = '\033[0m'   # 重置颜色
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 预先拼接带颜色的级别名称，format 时只需查表，不必为每条日志拼接字符串
+        self._colored_levelnames = {
+            level: f"{color}{level}{self.RESET}" for level, color in self.COLORS.items()
+        }
+    
     def format(self, record):
         original_levelname = record.levelname
         
-        log_color = self.COLORS.get(record.levelname, self.RESET)
-        record.levelname = f"{log_color}{record.levelname}{self.RESET}"
+        colored = self._colored_levelnames.get(original_levelname)
+        if colored is None:  # 自定义级别没有预设颜色
+            colored = f"{self.RESET}{original_levelname}{self.RESET}"
+        record.levelname = colored
         
         formatted = super().format(record)
         # 恢复原始 levelname，确保只在终端输出时生效
@@ -31,6 +44,56 @@ class ColoredFormatter(logging.Formatter):
         
         return formatted
 
+# LogRecord 自带的属性，其余属性视为通过 extra 传入的结构化字段
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", logging.INFO, "", 0, "", (), None))) | {"message", "asctime"}
+
+class JSONFormatter(logging.Formatter):
+    """JSON 日志格式化器
+    
+    每条日志输出为一行 JSON，包含时间、级别、位置、消息以及通过 extra 传入的结构化字段，
+    可直接被日志平台采集解析。使用 orjson 序列化，无法序列化的值转换为字符串。
+    
+    Example:
+        >>> logger.info("注册工具", extra={"agent": "planner", "tool": "search"})
+        {"time": "...", "level": "INFO", ..., "message": "注册工具", "agent": "planner", "tool": "search"}
+    """
+    
+    def format(self, record):
+        payload = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "location": f"{record.filename}:{record.lineno}",
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        
+        return orjson.dumps(payload, default=str).decode()
+
+# 每个日志器的文件处理器由各自的 QueueListener 在后台线程中写入，键为日志器名称
+_listeners: Dict[str, QueueListener] = {}
+
+# 已配置的日志器，键为日志器名称；get_logger 对同一名称只配置一次
+_loggers: Dict[str, logging.Logger] = {}
+
+def _stop_listener(name: str) -> None:
+    """停止日志器的后台写入线程，写完队列中剩余的日志后关闭文件处理器"""
+    listener = _listeners.pop(name, None)
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+@atexit.register
+def _stop_all_listeners() -> None:
+    """进程退出前写完所有排队中的日志"""
+    for name in list(_listeners):
+        _stop_listener(name)
+
 class ResGenieLogger:
     """ResGenie 日志管理器"""
     
@@ -64,6 +127,7 @@ class ResGenieLogger:
         self.logger.setLevel(getattr(logging, log_level.upper(), logging.INFO))
         
         # 防止重复添加处理器
+        _stop_listener(name)
         if self.logger.handlers:
             self.logger.handlers.clear()
         
@@ -82,6 +146,10 @@ class ResGenieLogger:
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         
+        # 文件日志启用 JSON 格式时，所有文件处理器统一使用 JSON 格式化器
+        if settings.log_json:
+            detailed_formatter = simple_formatter = JSONFormatter(datefmt='%Y-%m-%d %H:%M:%S')
+        
         # 控制台处理器
         if log_to_console:
             console_handler = logging.StreamHandler(sys.stdout)
@@ -93,7 +161,7 @@ class ResGenieLogger:
             console_handler.setFormatter(colored_formatter)
             self.logger.addHandler(console_handler)
         
-        # 文件处理器
+        # 文件处理器：由后台 QueueListener 写入磁盘，调用方线程只需将日志记录放入队列
         if log_to_file:
             # 主日志文件（按大小轮转）
             main_log_file = self.log_dir / f"{name}.log"
@@ -105,7 +173,6 @@ class ResGenieLogger:
             )
             file_handler.setLevel(logging.DEBUG)
             file_handler.setFormatter(detailed_formatter)
-            self.logger.addHandler(file_handler)
             
             # 错误日志文件（单独记录错误和严重错误）
             error_log_file = self.log_dir / f"{name}_error.log"
@@ -117,7 +184,6 @@ class ResGenieLogger:
             )
             error_handler.setLevel(logging.ERROR)
             error_handler.setFormatter(detailed_formatter)
-            self.logger.addHandler(error_handler)
             
             # 按日期轮转的日志文件
             daily_log_file = self.log_dir / f"{name}_daily.log"
@@ -131,12 +197,21 @@ class ResGenieLogger:
             daily_handler.suffix = "%Y-%m-%d"  # 每天的日志文件名后缀
             daily_handler.setLevel(logging.DEBUG)
             daily_handler.setFormatter(simple_formatter)
-            self.logger.addHandler(daily_handler)
+            
+            log_queue = queue.SimpleQueue()
+            listener = QueueListener(
+                log_queue, file_handler, error_handler, daily_handler,
+                respect_handler_level=True  # 各文件处理器仍按自身级别过滤（错误日志文件只记录 ERROR 及以上）
+            )
+            listener.start()
+            _listeners[name] = listener
+            self.logger.addHandler(QueueHandler(log_queue))
         
+        _loggers[name] = self.logger
         return self.logger
     
     def get_logger(self, name: str = "resgenie") -> logging.Logger:
-        """获取日志器
+        """获取日志器，每个名称只在首次获取时配置，之后直接返回已配置的日志器
         
         Args:
             name: 日志器名称
@@ -144,9 +219,9 @@ class ResGenieLogger:
         Returns:
             logging.Logger: 日志器实例
         """
-        if not self.logger or self.logger.name != name:
-            self.logger = self.init_logger(name)
-        
+        logger = _loggers.get(name)
+        # 已配置过的名称直接复用，避免在不同名称间切换时反复重建处理器
+        self.logger = logger if logger is not None else self.init_logger(name)
         return self.logger
     
     def set_level(self, level: str):
@@ -159,6 +234,7 @@ class ResGenieLogger:
 
     def clear_handlers(self):
         """清除所有处理器"""
+        _stop_listener(self.logger.name)
         self.logger.handlers.clear()
 
 # 创建全局日志管理器实例
@@ -248,13 +324,17 @@ def log_function_call(logger: logging.Logger):
     """
     def decorator(func):
         def wrapper(*args, **kwargs):
-            logger.debug(f"调用函数: {func.__name__} with args={args}, kwargs={kwargs}")
+            # 参数的 repr 可能很大，仅在 DEBUG 级别开启时才记录
+            debug = logger.isEnabledFor(logging.DEBUG)
+            if debug:
+                logger.debug("调用函数: %s with args=%r, kwargs=%r", func.__name__, args, kwargs)
             try:
                 result = func(*args, **kwargs)
-                logger.debug(f"函数 {func.__name__} 执行成功")
+                if debug:
+                    logger.debug("函数 %s 执行成功", func.__name__)
                 return result
             except Exception as e:
-                logger.error(f"函数 {func.__name__} 执行失败: {str(e)}")
+                logger.error("函数 %s 执行失败: %s", func.__name__, e)
                 raise
         return wrapper
     return decorator
@@ -279,7 +359,7 @@ def log_exception(logger: logging.Logger):
             try:
                 return func(*args, **kwargs)
             except Exception as e:
-                logger.exception(f"函数 {func.__name__} 发生异常: {str(e)}")
+                logger.exception("函数 %s 发生异常: %s", func.__name__, e)
                 raise
         return wrapper
     return decorator
\ No newline at end of file
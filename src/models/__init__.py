@@ -1,4 +1,21 @@
-"""ResGenie 数据库模型"""
+"""ResGenie 数据库模型
+
+所有关系属性都设置为 lazy="raise"，访问未加载的关系会直接抛出异常，
+避免遍历列表时每条记录各触发一次 SELECT（N+1 查询）。需要关联数据时在查询中显式加载：
+
+    from sqlalchemy import select
+    from sqlalchemy.orm import raiseload, selectinload
+
+    stmt = select(ResearchTask).options(
+        selectinload(ResearchTask.documents),
+        selectinload(ResearchTask.agent_executions),
+        selectinload(ResearchTask.report),
+        raiseload("*"),
+    )
+
+Document 和 Report 的大字段（正文、摘要、JSON 数据）为 "heavy" 延迟加载组，
+列表查询只取轻量字段，需要时使用 .options(undefer_group("heavy")) 一并加载。
+"""
 from .user import User
 from .task import ResearchTask
 from .document import Document
@@ -0,0 +1,10 @@
+"""模型公共定义"""
+from sqlalchemy import JSON, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+
+# 带时区的时间类型。类型对象不保存列相关的状态，所有时间列共享同一个实例
+TZ_DATETIME = DateTime(timezone=True)
+
+# JSON 列类型：PostgreSQL 上使用 JSONB（支持 GIN 索引和包含查询），其他数据库（如 sqlite）退回通用 JSON。
+# none_as_null=True：Python 的 None 存为 SQL NULL，而不是 JSON 的 null
+JSON_TYPE = JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql")
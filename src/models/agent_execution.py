@@ -1,11 +1,18 @@
 """智能体执行模型"""
-from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey, JSON, Enum, String
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Optional
+
+from sqlalchemy import Integer, Text, ForeignKey, JSON, Enum, Index
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 import enum
 
+from ._common import TZ_DATETIME
 from .user import Base
 
+if TYPE_CHECKING:
+    from .task import ResearchTask
+
 class AgentType(str, enum.Enum):
     """智能体类型枚举"""
     PLANNER = "planner"
@@ -23,22 +30,35 @@ class AgentStatus(str, enum.Enum):
 class AgentExecution(Base):
     """智能体执行表模型"""
     __tablename__ = "agent_executions"
+    __table_args__ = (
+        # 覆盖按任务加载执行记录（task_id 前缀）以及按任务+状态筛选两类查询
+        Index("ix_agent_exec_task_status", "task_id", "status"),
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
-    task_id = Column(Integer, ForeignKey("research_tasks.id"), nullable=False)
-    agent_type = Column(Enum(AgentType), nullable=False)
-    status = Column(Enum(AgentStatus), nullable=False, default=AgentStatus.PENDING)
-    input_data = Column(JSON, nullable=True)  # 智能体输入
-    output_data = Column(JSON, nullable=True)  # 智能体输出
-    execution_log = Column(Text, nullable=True)  # 执行日志
-    error_message = Column(Text, nullable=True)  # 错误信息
-    start_time = Column(DateTime(timezone=True), nullable=True)
-    end_time = Column(DateTime(timezone=True), nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    task_id: Mapped[int] = mapped_column(Integer, ForeignKey("research_tasks.id"), nullable=False)
+    # 枚举以字符串 + CHECK 约束存储（非数据库原生 ENUM），增加取值无需 ALTER TYPE
+    agent_type: Mapped[AgentType] = mapped_column(
+        Enum(AgentType, native_enum=False, create_constraint=True, length=16, name="ck_agent_exec_agent_type",
+             values_callable=lambda enum_cls: [member.value for member in enum_cls]),
+        nullable=False
+    )
+    status: Mapped[AgentStatus] = mapped_column(
+        Enum(AgentStatus, native_enum=False, create_constraint=True, length=16, name="ck_agent_exec_status",
+             values_callable=lambda enum_cls: [member.value for member in enum_cls]),
+        nullable=False, default=AgentStatus.PENDING
+    )
+    input_data: Mapped[Optional[Any]] = mapped_column(JSON, nullable=True)  # 智能体输入
+    output_data: Mapped[Optional[Any]] = mapped_column(JSON, nullable=True)  # 智能体输出
+    execution_log: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # 执行日志
+    error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # 错误信息
+    start_time: Mapped[Optional[datetime]] = mapped_column(TZ_DATETIME, nullable=True)
+    end_time: Mapped[Optional[datetime]] = mapped_column(TZ_DATETIME, nullable=True)
+    created_at: Mapped[Optional[datetime]] = mapped_column(TZ_DATETIME, server_default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(TZ_DATETIME, server_default=func.now(), onupdate=func.now())
     
     # 关系
-    task = relationship("ResearchTask", back_populates="agent_executions")
+    task: Mapped["ResearchTask"] = relationship("ResearchTask", back_populates="agent_executions", lazy="raise")
     
     def __repr__(self):
         return f"<AgentExecution(id={self.id}, agent_type='{self.agent_type}', status='{self.status}', context_id='{self.context_id}')>"
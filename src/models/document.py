@@ -1,30 +1,46 @@
 """文档模型"""
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from sqlalchemy import Integer, String, Text, ForeignKey, Index
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from ._common import JSON_TYPE, TZ_DATETIME
 from .user import Base
 
+if TYPE_CHECKING:
+    from .task import ResearchTask
+
 class Document(Base):
-    """文档表模型"""
+    """文档表模型
+    
+    摘要、正文和元数据属于 "heavy" 延迟加载组，查询时默认不加载，首次访问时才查询；
+    需要时通过 .options(undefer_group("heavy")) 随查询一并加载。
+    """
     __tablename__ = "documents"
+    __table_args__ = (
+        # GIN 索引支持关键词、元数据的包含查询（如 keywords @> '["LLM"]'），无需全表扫描
+        Index("ix_documents_keywords_gin", "keywords", postgresql_using="gin"),
+        Index("ix_documents_metadata_gin", "doc_metadata", postgresql_using="gin"),
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
-    task_id = Column(Integer, ForeignKey("research_tasks.id"), nullable=False)
-    title = Column(Text, nullable=False)
-    authors = Column(JSON, nullable=True)  # 作者列表
-    abstract = Column(Text, nullable=True)
-    keywords = Column(JSON, nullable=True)  # 关键词列表
-    url = Column(String(500), nullable=True)
-    source = Column(String(100), nullable=True)  # 来源，如 arxiv, pubmed 等
-    publication_date = Column(DateTime(timezone=True), nullable=True)
-    content = Column(Text, nullable=True)
-    doc_metadata = Column(JSON, nullable=True)  # 其他元数据
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    task_id: Mapped[int] = mapped_column(Integer, ForeignKey("research_tasks.id"), nullable=False, index=True)
+    title: Mapped[str] = mapped_column(Text, nullable=False)
+    authors: Mapped[Optional[List[str]]] = mapped_column(JSON_TYPE, nullable=True)  # 作者列表
+    abstract: Mapped[Optional[str]] = mapped_column(Text, nullable=True, deferred=True, deferred_group="heavy")
+    keywords: Mapped[Optional[List[str]]] = mapped_column(JSON_TYPE, nullable=True)  # 关键词列表
+    url: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    source: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)  # 来源，如 arxiv, pubmed 等
+    publication_date: Mapped[Optional[datetime]] = mapped_column(TZ_DATETIME, nullable=True)
+    content: Mapped[Optional[str]] = mapped_column(Text, nullable=True, deferred=True, deferred_group="heavy")
+    doc_metadata: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON_TYPE, nullable=True, deferred=True, deferred_group="heavy")  # 其他元数据
+    created_at: Mapped[Optional[datetime]] = mapped_column(TZ_DATETIME, server_default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(TZ_DATETIME, server_default=func.now(), onupdate=func.now())
     
     # 关系
-    task = relationship("ResearchTask", back_populates="documents")
+    task: Mapped["ResearchTask"] = relationship("ResearchTask", back_populates="documents", lazy="raise")
     
     def __repr__(self):
         return f"<Document(id={self.id}, title='{self.title[:50]}...', source='{self.source}')>"
@@ -1,27 +1,38 @@
 """报告模型"""
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from sqlalchemy import Integer, String, Text, ForeignKey
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from ._common import JSON_TYPE, TZ_DATETIME
 from .user import Base
 
+if TYPE_CHECKING:
+    from .task import ResearchTask
+
 class Report(Base):
-    """报告表模型"""
+    """报告表模型
+    
+    正文、统计、可视化和引用数据属于 "heavy" 延迟加载组，查询时默认不加载，首次访问时才查询；
+    需要时通过 .options(undefer_group("heavy")) 随查询一并加载。
+    """
     __tablename__ = "reports"
     
-    id = Column(Integer, primary_key=True, index=True)
-    task_id = Column(Integer, ForeignKey("research_tasks.id"), nullable=False, unique=True)
-    title = Column(Text, nullable=False)
-    content = Column(Text, nullable=False)
-    format = Column(String(20), nullable=False, default="markdown")  # markdown, pdf
-    statistics = Column(JSON, nullable=True)  # 统计信息
-    visualizations = Column(JSON, nullable=True)  # 可视化数据
-    citations = Column(JSON, nullable=True)  # 引用信息
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    task_id: Mapped[int] = mapped_column(Integer, ForeignKey("research_tasks.id"), nullable=False, unique=True)
+    title: Mapped[str] = mapped_column(Text, nullable=False)
+    content: Mapped[str] = mapped_column(Text, nullable=False, deferred=True, deferred_group="heavy")
+    format: Mapped[str] = mapped_column(String(20), nullable=False, default="markdown")  # markdown, pdf
+    statistics: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON_TYPE, nullable=True, deferred=True, deferred_group="heavy")  # 统计信息
+    visualizations: Mapped[Optional[Any]] = mapped_column(JSON_TYPE, nullable=True, deferred=True, deferred_group="heavy")  # 可视化数据
+    citations: Mapped[Optional[Any]] = mapped_column(JSON_TYPE, nullable=True, deferred=True, deferred_group="heavy")  # 引用信息
+    created_at: Mapped[Optional[datetime]] = mapped_column(TZ_DATETIME, server_default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(TZ_DATETIME, server_default=func.now(), onupdate=func.now())
     
     # 关系
-    task = relationship("ResearchTask", back_populates="report")  # 报告所属研究任务， back_populates="report" 表示在 ResearchTask 模型中添加一个 report 属性，用于访问该研究任务的报告记录
+    task: Mapped["ResearchTask"] = relationship("ResearchTask", back_populates="report", lazy="raise")  # 报告所属研究任务， back_populates="report" 表示在 ResearchTask 模型中添加一个 report 属性，用于访问该研究任务的报告记录
     
     def __repr__(self):
         return f"<Report(id={self.id}, title='{self.title[:50]}...', format='{self.format}')>"
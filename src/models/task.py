@@ -1,11 +1,21 @@
 """研究任务模型"""
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Optional
+
+from sqlalchemy import Integer, String, Text, ForeignKey, Enum, Index, text
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import Mapped, backref, mapped_column, relationship
 import enum
 
+from ._common import TZ_DATETIME
 from .user import Base
 
+if TYPE_CHECKING:
+    from .agent_execution import AgentExecution
+    from .document import Document
+    from .report import Report
+    from .user import User
+
 class TaskStatus(str, enum.Enum):
     """任务状态枚举"""
     PENDING = "pending"  # 待处理
@@ -16,26 +26,39 @@ class TaskStatus(str, enum.Enum):
 class ResearchTask(Base):
     """研究任务表模型"""
     __tablename__ = "research_tasks"
+    __table_args__ = (
+        Index("ix_tasks_user_status", "user_id", "status"),  # 查询某用户指定状态的任务（如运行中的任务）
+        # 部分索引只包含待处理/运行中的任务，调度轮询的开销与历史任务数量无关
+        Index(
+            "ix_tasks_status_active", "status", "created_at",
+            postgresql_where=text("status IN ('pending', 'running')")
+        ),
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # 研究任务所属用户ID， nullable=True 表示研究任务可以不关联任何用户
-    query = Column(Text, nullable=False)  # 研究任务的查询语句
-    depth = Column(String(20), nullable=False)  # 研究任务的深度，可选值为 shallow, moderate, deep
-    language = Column(String(10), nullable=False, default="zh")  # 研究任务的语言，可选值为 zh, en
-    max_documents = Column(Integer, nullable=False, default=100)  # 研究任务的最大文档数，默认值为 100
-    status = Column(Enum(TaskStatus), nullable=False, default=TaskStatus.PENDING)  # 研究任务的状态，默认值为 PENDING
-    progress = Column(Integer, nullable=False, default=0)  # 研究任务的进度，默认值为 0
-    result_url = Column(String(500), nullable=True)  # 研究任务的结果URL， nullable=True 表示研究任务可以不生成结果URL
-    error_message = Column(Text, nullable=True)  # 研究任务的错误信息， nullable=True 表示研究任务可以不包含错误信息
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
-    completed_at = Column(DateTime(timezone=True), nullable=True)  # 研究任务的完成时间， nullable=True 表示研究任务可以不包含完成时间
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    user_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("users.id"), nullable=True)  # 研究任务所属用户ID， nullable=True 表示研究任务可以不关联任何用户
+    query: Mapped[str] = mapped_column(Text, nullable=False)  # 研究任务的查询语句
+    depth: Mapped[str] = mapped_column(String(20), nullable=False)  # 研究任务的深度，可选值为 shallow, moderate, deep
+    language: Mapped[str] = mapped_column(String(10), nullable=False, default="zh")  # 研究任务的语言，可选值为 zh, en
+    max_documents: Mapped[int] = mapped_column(Integer, nullable=False, default=100)  # 研究任务的最大文档数，默认值为 100
+    status: Mapped[TaskStatus] = mapped_column(  # 研究任务的状态，默认值为 PENDING
+        # 以字符串 + CHECK 约束存储枚举值（非数据库原生 ENUM），增加状态无需 ALTER TYPE
+        Enum(TaskStatus, native_enum=False, create_constraint=True, length=16, name="ck_tasks_status",
+             values_callable=lambda enum_cls: [member.value for member in enum_cls]),
+        nullable=False, default=TaskStatus.PENDING
+    )
+    progress: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # 研究任务的进度，默认值为 0
+    result_url: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)  # 研究任务的结果URL， nullable=True 表示研究任务可以不生成结果URL
+    error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # 研究任务的错误信息， nullable=True 表示研究任务可以不包含错误信息
+    created_at: Mapped[Optional[datetime]] = mapped_column(TZ_DATETIME, server_default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(TZ_DATETIME, server_default=func.now(), onupdate=func.now())
+    completed_at: Mapped[Optional[datetime]] = mapped_column(TZ_DATETIME, nullable=True)  # 研究任务的完成时间， nullable=True 表示研究任务可以不包含完成时间
     
-    # 关系
-    user = relationship("User", backref="tasks")  # 研究任务所属用户， backref="tasks" 表示在 User 模型中添加一个 tasks 属性，用于访问该用户的所有研究任务
-    agent_executions = relationship("AgentExecution", back_populates="task")  # 研究任务的智能体执行记录， back_populates="task" 表示在 AgentExecution 模型中添加一个 task 属性，用于访问该智能体执行记录所属的研究任务
-    documents = relationship("Document", back_populates="task")  # 研究任务的文档记录， back_populates="task" 表示在 Document 模型中添加一个 task 属性，用于访问该文档记录所属的研究任务
-    report = relationship("Report", back_populates="task", uselist=False)  # 研究任务的报告记录， back_populates="task" 表示在 Report 模型中添加一个 task 属性，用于访问该报告记录所属的研究任务
+    # 关系（lazy="raise"：禁止隐式懒加载，需在查询时通过 selectinload 显式加载，见 models 包说明）
+    user: Mapped[Optional["User"]] = relationship("User", backref=backref("tasks", lazy="raise"), lazy="raise")  # 研究任务所属用户， backref="tasks" 表示在 User 模型中添加一个 tasks 属性，用于访问该用户的所有研究任务
+    agent_executions: Mapped[List["AgentExecution"]] = relationship("AgentExecution", back_populates="task", lazy="raise")  # 研究任务的智能体执行记录， back_populates="task" 表示在 AgentExecution 模型中添加一个 task 属性，用于访问该智能体执行记录所属的研究任务
+    documents: Mapped[List["Document"]] = relationship("Document", back_populates="task", lazy="raise")  # 研究任务的文档记录， back_populates="task" 表示在 Document 模型中添加一个 task 属性，用于访问该文档记录所属的研究任务
+    report: Mapped[Optional["Report"]] = relationship("Report", back_populates="task", uselist=False, lazy="raise")  # 研究任务的报告记录， back_populates="task" 表示在 Report 模型中添加一个 task 属性，用于访问该报告记录所属的研究任务
     
     def __repr__(self):
         return f"<ResearchTask(id={self.id}, query='{self.query[:50]}...', status='{self.status}')>"
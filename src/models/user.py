@@ -1,23 +1,28 @@
 """用户模型"""
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Integer, String, Boolean
 from sqlalchemy.sql import func
+from sqlalchemy.orm import Mapped, mapped_column
 
 from ..core.database import Base
+from ._common import TZ_DATETIME
 
 
 class User(Base):
     """用户表模型"""
     __tablename__ = "users"
     
-    id = Column(Integer, primary_key=True, index=True)
-    username = Column(String(100), unique=True, index=True, nullable=False)
-    email = Column(String(255), unique=True, index=True, nullable=False)
-    password_hash = Column(String(255), nullable=False)
-    full_name = Column(String(255), nullable=True)
-    is_active = Column(Boolean, default=True)
-    is_admin = Column(Boolean, default=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    username: Mapped[str] = mapped_column(String(100), unique=True, index=True, nullable=False)
+    email: Mapped[str] = mapped_column(String(255), unique=True, index=True, nullable=False)
+    password_hash: Mapped[str] = mapped_column(String(255), nullable=False)
+    full_name: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    is_active: Mapped[Optional[bool]] = mapped_column(Boolean, default=True)
+    is_admin: Mapped[Optional[bool]] = mapped_column(Boolean, default=False)
+    created_at: Mapped[Optional[datetime]] = mapped_column(TZ_DATETIME, server_default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(TZ_DATETIME, server_default=func.now(), onupdate=func.now())
     
     def __repr__(self):
         return f"<User(id={self.id}, username='{self.username}', email='{self.email}')>"
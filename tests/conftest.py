@@ -0,0 +1,45 @@
+"""测试公共夹具
+
+数据库模块在夹具内部导入：conftest 会在每次测试运行时加载，
+只运行智能体或日志测试时不需要创建数据库引擎、加载 SQLAlchemy。
+"""
+from typing import TYPE_CHECKING, Generator
+
+import pytest
+
+if TYPE_CHECKING:
+    from sqlalchemy.orm import Session
+
+
+@pytest.fixture(scope="session")
+def db_url() -> str:
+    """当前环境的数据库URL"""
+    from src.core.database import _get_database_url
+    return _get_database_url()
+
+
+@pytest.fixture(scope="session")
+def db_schema() -> Generator[None, None, None]:
+    """整个测试会话只建表、删表各一次，避免每个测试重复执行 DDL"""
+    from src.core.database import drop_db, init_db
+    init_db()
+    yield
+    drop_db()
+
+
+@pytest.fixture
+def db_session(db_schema) -> Generator["Session", None, None]:
+    """在外层事务中运行的数据库会话，测试结束后整体回滚，测试之间的数据互不影响
+
+    会话内的 commit() 只提交保存点，不会真正写入数据库。
+    """
+    from sqlalchemy.orm import Session
+    from src.core.database import engine
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        session = Session(bind=connection, join_transaction_mode="create_savepoint")
+        try:
+            yield session
+        finally:
+            session.close()
+            transaction.rollback()
@@ -1,26 +1,29 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-"""ResGenie 智能体基类测试脚本
+"""ResGenie 智能体基类测试
 
-该脚本全面测试 base.py 模块中的所有类和方法，包括：
+全面测试 base.py 模块中的所有类和方法，包括：
 - AgentStatus 枚举类
 - AgentState TypedDict
 - AgentError 异常类及其子类
 - BaseAgent 抽象基类的所有方法
-
-测试输出包含详细的 DEBUG 信息，便于定位问题。
 """
 import asyncio
-import sys
-from pathlib import Path
-from typing import Any
+import copy
+import logging
+import pickle
+import threading
+
+import pytest
 
-sys.path.insert(0, str(Path(__file__).parent.parent))
+# 未安装 LangChain 的环境中跳过整个模块，而不是在收集阶段导入失败
+pytest.importorskip("langchain_core")
 
+import httpx
+import requests
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool, tool
 
 from src.agents import (
+    AgentCache,
     AgentError,
     AgentState,
     AgentStatus,
@@ -29,94 +32,21 @@ from src.agents import (
     ToolExecutionError,
     ToolNotFoundError,
 )
-
-
-class TestStats:
-    """测试统计类"""
-    def __init__(self):
-        self.total = 0
-        self.passed = 0
-        self.failed = 0
-    
-    def add_pass(self):
-        self.total += 1
-        self.passed += 1
-    
-    def add_fail(self):
-        self.total += 1
-        self.failed += 1
-    
-    def summary(self) -> str:
-        return f"\n{'='*60}\n测试总结: 总计 {self.total} 个测试, 通过 {self.passed} 个, 失败 {self.failed} 个\n{'='*60}"
-
-
-stats = TestStats()
-
-
-def print_header(title: str) -> None:
-    """打印测试区块标题"""
-    print(f"\n{'='*60}")
-    print(f"  {title}")
-    print(f"{'='*60}")
-
-
-def print_test(func_name: str, input_info: str, actual: Any, expected: Any = None, passed: bool = True) -> None:
-    """打印测试详情"""
-    status = "✅ 通过" if passed else "❌ 失败"
-    print(f"\n[测试] {func_name}")
-    print(f"  输入: {input_info}")
-    print(f"  实际输出: {actual}")
-    if expected is not None:
-        print(f"  预期输出: {expected}")
-    print(f"  状态: {status}")
-    
-    if passed:
-        stats.add_pass()
-    else:
-        stats.add_fail()
-
-
-def assert_equal(actual: Any, expected: Any, func_name: str, input_info: str) -> bool:
-    """断言相等"""
-    passed = actual == expected
-    print_test(func_name, input_info, actual, expected, passed)
-    return passed
-
-
-def assert_true(condition: bool, func_name: str, input_info: str, actual: Any) -> bool:
-    """断言为真"""
-    print_test(func_name, input_info, actual, passed=condition)
-    return condition
-
-
-def assert_raises(exception_class: type, func_name: str, input_info: str, func, *args, **kwargs) -> bool:
-    """断言抛出异常"""
-    try:
-        func(*args, **kwargs)
-        print_test(func_name, input_info, "未抛出异常", f"应抛出 {exception_class.__name__}", passed=False)
-        stats.add_fail()
-        return False
-    except exception_class as e:
-        print_test(func_name, input_info, f"抛出 {type(e).__name__}: {e}", f"应抛出 {exception_class.__name__}", passed=True)
-        stats.add_pass()
-        return True
-    except Exception as e:
-        print_test(func_name, input_info, f"抛出 {type(e).__name__}: {e}", f"应抛出 {exception_class.__name__}", passed=False)
-        stats.add_fail()
-        return False
+from src.core.checkpoint import Checkpointer
+from src.core.config import settings
 
 
 class MockAgent(BaseAgent):
     """测试用模拟智能体"""
-    
+
     @property
     def name(self) -> str:
         return "mock_agent"
-    
+
     @property
     def description(self) -> str:
         return "用于测试的模拟智能体"
-    
+
     async def run(self, state: AgentState) -> AgentState:
         state["status"] = AgentStatus.COMPLETED
         return state
@@ -134,413 +64,573 @@ def failing_tool(query: str) -> str:
     raise RuntimeError("工具执行失败")
 
 
-def test_agent_status():
-    """测试 AgentStatus 枚举类"""
-    print_header("测试 AgentStatus 枚举类")
-    
-    assert_equal(AgentStatus.IDLE.value, "idle", "AgentStatus.IDLE.value", "AgentStatus.IDLE")
-    assert_equal(AgentStatus.RUNNING.value, "running", "AgentStatus.RUNNING.value", "AgentStatus.RUNNING")
-    assert_equal(AgentStatus.WAITING.value, "waiting", "AgentStatus.WAITING.value", "AgentStatus.WAITING")
-    assert_equal(AgentStatus.COMPLETED.value, "completed", "AgentStatus.COMPLETED.value", "AgentStatus.COMPLETED")
-    assert_equal(AgentStatus.FAILED.value, "failed", "AgentStatus.FAILED.value", "AgentStatus.FAILED")
-    
-    assert_true(AgentStatus.IDLE == "idle", "AgentStatus 字符串比较", "AgentStatus.IDLE == 'idle'", AgentStatus.IDLE == "idle")
-    
-    status = AgentStatus.RUNNING
-    assert_equal(f"状态: {status}", "状态: running", "AgentStatus 字符串格式化", "状态: running")
+def custom_tool(x: int) -> int:
+    """自定义工具（普通函数，注册后由智能体按需转换为 StructuredTool）"""
+    return x * 2
+
+
+@pytest.fixture
+def agent() -> MockAgent:
+    """默认配置的模拟智能体"""
+    return MockAgent()
+
+
+@pytest.mark.parametrize("member, value", [
+    (AgentStatus.IDLE, "idle"),
+    (AgentStatus.RUNNING, "running"),
+    (AgentStatus.WAITING, "waiting"),
+    (AgentStatus.COMPLETED, "completed"),
+    (AgentStatus.FAILED, "failed"),
+])
+def test_agent_status_value(member, value):
+    """测试 AgentStatus 枚举值"""
+    assert member.value == value
+    assert member == value
+    assert f"状态: {member}" == f"状态: {value}"
+
+
+@pytest.mark.parametrize("member, terminal", [
+    (AgentStatus.IDLE, False),
+    (AgentStatus.RUNNING, False),
+    (AgentStatus.WAITING, False),
+    (AgentStatus.COMPLETED, True),
+    (AgentStatus.FAILED, True),
+])
+def test_agent_status_is_terminal(member, terminal):
+    """测试 AgentStatus 终止状态判断"""
+    assert member.is_terminal is terminal
 
 
 def test_agent_state():
     """测试 AgentState TypedDict"""
-    print_header("测试 AgentState TypedDict")
-    
-    state: AgentState = AgentState(
-        messages=[],
-        current_task="测试任务",
-        agent_type="test",
-        status=AgentStatus.IDLE,
-        tools_output={},
-        context={},
-        error="",
-        metadata={}
-    )
-    
-    assert_equal(state["current_task"], "测试任务", "AgentState 字段访问", "测试任务")
-    assert_equal(state["status"], AgentStatus.IDLE, "AgentState status 字段", AgentStatus.IDLE)
-    
+    state: AgentState = {
+        "messages": [],
+        "current_task": "测试任务",
+        "agent_type": "test",
+        "status": AgentStatus.IDLE,
+        "tools_output": {},
+        "context": {},
+        "error": "",
+        "metadata": {},
+    }
+
+    assert state["current_task"] == "测试任务"
+    assert state["status"] == AgentStatus.IDLE
+
     state["messages"] = [HumanMessage(content="你好")]
-    assert_equal(len(state["messages"]), 1, "AgentState messages 添加", 1)
+    assert len(state["messages"]) == 1
 
 
 def test_agent_error():
     """测试 AgentError 异常类"""
-    print_header("测试 AgentError 异常类")
-    
-    e1 = AgentError("测试错误")
-    assert_equal(str(e1), "测试错误", "AgentError 基本消息", "测试错误")
-    
-    e2 = AgentError("测试错误", agent_name="test_agent")
-    assert_equal(str(e2), "[test_agent] | 测试错误", "AgentError 带智能体名称", "[test_agent] | 测试错误")
-    
+    assert str(AgentError("测试错误")) == "测试错误"
+    assert str(AgentError("测试错误", agent_name="test_agent")) == "[test_agent] | 测试错误"
+
     try:
         raise ValueError("原始错误")
     except ValueError as original:
-        e3 = AgentError("测试错误", agent_name="test_agent", original_error=original)
-        expected = "[test_agent] | 测试错误 | 原因: 原始错误"
-        assert_equal(str(e3), expected, "AgentError 带原始异常", expected)
+        e = AgentError("测试错误", agent_name="test_agent", original_error=original)
+        assert str(e) == "[test_agent] | 测试错误 | 原因: 原始错误"
 
 
 def test_tool_not_found_error():
     """测试 ToolNotFoundError 异常类"""
-    print_header("测试 ToolNotFoundError 异常类")
-    
     e = ToolNotFoundError("工具不存在", agent_name="mock_agent")
-    assert_true("[mock_agent]" in str(e), "ToolNotFoundError 消息格式", str(e), "[mock_agent]" in str(e))
+    assert "[mock_agent]" in str(e)
 
 
 def test_tool_execution_error():
     """测试 ToolExecutionError 异常类"""
-    print_header("测试 ToolExecutionError 异常类")
-    
     original = RuntimeError("连接超时")
     e = ToolExecutionError("执行失败", agent_name="mock_agent", original_error=original)
-    assert_true("执行失败" in str(e), "ToolExecutionError 消息", str(e), "执行失败" in str(e))
-    assert_true("连接超时" in str(e), "ToolExecutionError 原始错误", str(e), "连接超时" in str(e))
+    assert "执行失败" in str(e)
+    assert "连接超时" in str(e)
+
+
+@pytest.mark.parametrize("error_class", [AgentError, ToolNotFoundError, ToolExecutionError, StateValidationError])
+def test_agent_error_pickle_copy(error_class):
+    """测试异常经过 pickle/copy 后保留所有字段（跨进程传递异常）"""
+    e = error_class("boom", agent_name="a", original_error=ValueError("x"))
+    for restored in (pickle.loads(pickle.dumps(e)), copy.copy(e)):
+        assert type(restored) is error_class
+        assert restored.message == "boom"
+        assert restored.agent_name == "a"
+        assert type(restored.original_error) is ValueError
+        assert str(restored.original_error) == "x"
+        assert str(restored) == str(e)
 
 
 def test_state_validation_error():
     """测试 StateValidationError 异常类"""
-    print_header("测试 StateValidationError 异常类")
-    
     e = StateValidationError("状态无效", agent_name="mock_agent")
-    assert_true("状态无效" in str(e), "StateValidationError 消息", str(e), "状态无效" in str(e))
+    assert "状态无效" in str(e)
 
 
-def test_base_agent_init():
+def test_base_agent_init(agent):
     """测试 BaseAgent 初始化"""
-    print_header("测试 BaseAgent 初始化")
-    
-    agent = MockAgent()
-    assert_equal(agent.name, "mock_agent", "agent.name", "mock_agent")
-    assert_equal(agent.description, "用于测试的模拟智能体", "agent.description", "用于测试的模拟智能体")
-    assert_equal(agent.max_retries, 3, "agent.max_retries 默认值", 3)
-    assert_equal(agent.timeout, 30.0, "agent.timeout 默认值", 30.0)
-    assert_equal(agent.tools, [], "agent.tools 默认空列表", [])
-    assert_equal(agent.state["status"], AgentStatus.IDLE, "agent.state['status']", AgentStatus.IDLE)
-    
+    assert agent.name == "mock_agent"
+    assert agent.description == "用于测试的模拟智能体"
+    assert agent.max_retries == 3
+    assert agent.timeout == 30.0
+    assert agent.tools == []
+    assert agent.state["status"] == AgentStatus.IDLE
+
     agent2 = MockAgent(max_retries=5, timeout=60.0)
-    assert_equal(agent2.max_retries, 5, "agent.max_retries 自定义值", 5)
-    assert_equal(agent2.timeout, 60.0, "agent.timeout 自定义值", 60.0)
+    assert agent2.max_retries == 5
+    assert agent2.timeout == 60.0
 
 
-def test_base_agent_repr_str():
+def test_base_agent_repr_str(agent):
     """测试 BaseAgent __repr__ 和 __str__"""
-    print_header("测试 BaseAgent __repr__ 和 __str__")
-    
-    agent = MockAgent()
-    
     repr_result = repr(agent)
-    assert_true("MockAgent" in repr_result, "__repr__ 包含类名", repr_result, "MockAgent" in repr_result)
-    assert_true("mock_agent" in repr_result, "__repr__ 包含名称", repr_result, "mock_agent" in repr_result)
-    
-    str_result = str(agent)
-    assert_equal(str_result, "[mock_agent] 用于测试的模拟智能体", "__str__ 输出", "[mock_agent] 用于测试的模拟智能体")
+    assert "MockAgent" in repr_result
+    assert "mock_agent" in repr_result
+
+    assert str(agent) == "[mock_agent] 用于测试的模拟智能体"
 
 
-def test_state_management():
+def test_state_management(agent):
     """测试状态管理方法"""
-    print_header("测试状态管理方法")
-    
-    agent = MockAgent()
-    
     agent.update_state(status=AgentStatus.RUNNING, current_task="测试任务")
-    assert_equal(agent.state["status"], AgentStatus.RUNNING, "update_state 更新 status", AgentStatus.RUNNING)
-    assert_equal(agent.state["current_task"], "测试任务", "update_state 更新 current_task", "测试任务")
-    
+    assert agent.state["status"] == AgentStatus.RUNNING
+    assert agent.state["current_task"] == "测试任务"
+
     agent.update_state(invalid_key="无效值")
-    assert_true("invalid_key" not in agent.state, "update_state 忽略无效字段", "invalid_key not in state", "invalid_key" not in agent.state)
-    
+    assert "invalid_key" not in agent.state, "update_state 应忽略无效字段"
+
+    agent.reset_state()
+    assert agent.state["status"] == AgentStatus.IDLE
+    assert agent.state["current_task"] == ""
+
+    assert agent.validate_state()
+
+
+def test_reset_state_fresh_containers(agent):
+    """测试状态模板中的可变容器不会在智能体之间或重置前后共享"""
+    other = MockAgent()
+    for key in ("messages", "tools_output", "context", "metadata"):
+        assert agent.state[key] is not other.state[key], f"{key} 不应在智能体之间共享"
+
+    agent.set_context("key", "value")
+    old_context = agent.state["context"]
     agent.reset_state()
-    assert_equal(agent.state["status"], AgentStatus.IDLE, "reset_state 重置状态", AgentStatus.IDLE)
-    assert_equal(agent.state["current_task"], "", "reset_state 清空任务", "")
-    
-    result = agent.validate_state()
-    assert_true(result, "validate_state 验证有效状态", result, result)
+    assert agent.state["context"] == {}
+    assert agent.state["context"] is not old_context, "reset_state 应创建新的 context"
+    assert other.state["context"] == {}, "其他智能体的 context 不应受影响"
 
 
-def test_tool_registration():
+def test_tool_registration(agent):
     """测试工具注册方法"""
-    print_header("测试工具注册方法")
-    
-    agent = MockAgent()
-    
     agent.register_tool(sample_search_tool)
-    assert_equal(len(agent.tools), 1, "register_tool 注册工具", 1)
-    assert_equal(agent.tool_names, ["sample_search_tool"], "tool_names", ["sample_search_tool"])
-    
-    def custom_tool(x: int) -> int:
-        """自定义工具"""
-        return x * 2
-    
+    assert len(agent.tools) == 1
+    assert agent.tool_names == ["sample_search_tool"]
+
     agent.register_tool(custom_tool, name="double")
-    assert_equal(agent.tool_names, ["sample_search_tool", "double"], "register_tool 注册函数", ["sample_search_tool", "double"])
-    
-    assert_raises(
-        ValueError,
-        "register_tool 重复注册（无 overwrite）",
-        "sample_search_tool",
-        agent.register_tool,
-        sample_search_tool
-    )
-    
+    assert agent.tool_names == ["sample_search_tool", "double"]
+
+    double_tool = agent.get_tool("double")
+    assert isinstance(double_tool, StructuredTool), "get_tool 应将函数转换为 StructuredTool"
+    assert agent.get_tool("double") is double_tool, "get_tool 应复用已转换的工具"
+
+    other_agent = MockAgent(tools=[custom_tool])
+    assert other_agent.get_tool("custom_tool") is double_tool, "多个智能体应共享同一函数的转换结果"
+
+    with pytest.raises(ValueError):
+        agent.register_tool(sample_search_tool)
+
     agent.register_tool(sample_search_tool, overwrite=True)
-    assert_equal(len(agent.tools), 2, "register_tool 覆盖注册", 2)
-    
-    result = agent.unregister_tool("double")
-    assert_true(result, "unregister_tool 成功注销", result, result)
-    assert_equal(agent.tool_names, ["sample_search_tool"], "注销后工具列表", ["sample_search_tool"])
-    
-    result = agent.unregister_tool("non_existent")
-    assert_true(not result, "unregister_tool 注销不存在的工具", result, not result)
-    
-    tool = agent.get_tool("sample_search_tool")
-    assert_true(tool is not None, "get_tool 获取存在的工具", tool, tool is not None)
-    
-    tool = agent.get_tool("non_existent")
-    assert_true(tool is None, "get_tool 获取不存在的工具", tool, tool is None)
+    assert len(agent.tools) == 2
+
+    assert agent.unregister_tool("double")
+    assert agent.tool_names == ["sample_search_tool"]
+    assert not agent.unregister_tool("non_existent")
+
+    assert agent.get_tool("sample_search_tool") is not None
+    assert agent.get_tool("non_existent") is None
+
+
+def test_register_invalid_function_tool(agent):
+    """测试函数工具在注册时校验：缺少文档字符串或类型注解无法解析时立即报错"""
+    def no_doc(x: int) -> int:
+        return x
+
+    def bad_hint(x: "UndefinedType") -> int:  # noqa: F821
+        """类型注解无法解析的工具"""
+        return x
+
+    for func in (no_doc, bad_hint):
+        with pytest.raises(ValueError):
+            agent.register_tool(func)
+    assert agent.tool_names == [], "校验失败的工具不应被注册"
+    assert agent.tools == []
 
 
 def test_tool_invocation_sync():
     """测试同步工具调用"""
-    print_header("测试同步工具调用")
-    
     agent = MockAgent(tools=[sample_search_tool])
-    
-    result = agent.invoke_tool_sync("sample_search_tool", {"query": "测试查询"})
-    assert_equal(result, "搜索结果: 测试查询", "invoke_tool_sync 正常调用", "搜索结果: 测试查询")
-    
-    assert_true("sample_search_tool" in agent.state["tools_output"], "工具结果缓存", agent.state["tools_output"], "sample_search_tool" in agent.state["tools_output"])
-    
-    assert_raises(
-        ToolNotFoundError,
-        "invoke_tool_sync 工具不存在",
-        "non_existent",
-        agent.invoke_tool_sync,
-        "non_existent"
-    )
-
-
-def test_tool_invocation_async():
+
+    assert agent.invoke_tool_sync("sample_search_tool", {"query": "测试查询"}) == "搜索结果: 测试查询"
+    assert "sample_search_tool" in agent.state["tools_output"], "工具结果未写入 tools_output"
+
+    with pytest.raises(ToolNotFoundError):
+        agent.invoke_tool_sync("non_existent")
+
+
+@pytest.mark.asyncio
+async def test_tool_invocation_async():
     """测试异步工具调用"""
-    print_header("测试异步工具调用")
-    
-    async def run_async_tests():
-        agent = MockAgent(tools=[sample_search_tool])
-        
-        result = await agent.invoke_tool("sample_search_tool", {"query": "异步测试"})
-        assert_equal(result, "搜索结果: 异步测试", "invoke_tool 异步调用", "搜索结果: 异步测试")
-        
-        try:
-            await agent.invoke_tool("non_existent")
-            print_test("invoke_tool 工具不存在", "non_existent", "未抛出异常", passed=False)
-            stats.add_fail()
-        except ToolNotFoundError:
-            print_test("invoke_tool 工具不存在", "non_existent", "抛出 ToolNotFoundError", passed=True)
-            stats.add_pass()
-    
-    asyncio.run(run_async_tests())
-
-
-def test_tool_retry():
+    agent = MockAgent(tools=[sample_search_tool])
+
+    assert await agent.invoke_tool("sample_search_tool", {"query": "异步测试"}) == "搜索结果: 异步测试"
+
+    with pytest.raises(ToolNotFoundError):
+        await agent.invoke_tool("non_existent")
+
+
+@pytest.mark.asyncio
+async def test_tool_invocation_parallel():
+    """测试并发工具调用"""
+    agent = MockAgent(tools=[sample_search_tool, failing_tool], max_retries=1)
+
+    results = await agent.invoke_tools_parallel([
+        ("sample_search_tool", ({"query": "并发1"},), {}),
+        ("failing_tool", ({"query": "并发2"},), {}),
+        ("non_existent", (), {}),
+        ("sample_search_tool", ({"query": "并发3"},), {}),
+    ])
+    assert len(results) == 4
+    assert results[0] == "搜索结果: 并发1", "结果顺序应与调用顺序一致"
+    assert isinstance(results[1], ToolExecutionError), "失败调用应返回异常"
+    assert isinstance(results[2], ToolNotFoundError), "工具不存在应返回异常"
+    assert results[3] == "搜索结果: 并发3", "其他调用不应受失败调用影响"
+
+
+@pytest.mark.asyncio
+async def test_tool_cache():
+    """测试工具结果缓存"""
+    calls = []
+
+    def counting_tool(query: str) -> str:
+        """记录调用次数的工具"""
+        calls.append(query)
+        return f"结果: {query}"
+
+    cache = AgentCache(max_size=2, ttl=60)
+    agent = MockAgent(tools=[counting_tool], cache=cache)
+
+    agent.invoke_tool_sync("counting_tool", {"query": "a"})
+    assert agent.invoke_tool_sync("counting_tool", {"query": "a"}) == "结果: a"
+    assert len(calls) == 1, "缓存命中时不应重复调用工具"
+
+    agent.invoke_tool_sync("counting_tool", {"query": "a"}, use_cache=False)
+    assert len(calls) == 2, "use_cache=False 应跳过缓存"
+
+    await agent.invoke_tool("counting_tool", {"query": "a"})
+    assert len(calls) == 2, "异步调用应共享缓存"
+
+    agent.invoke_tool_sync("counting_tool", {"query": "b"})
+    agent.invoke_tool_sync("counting_tool", {"query": "c"})
+    assert len(cache) == 2, "超过 max_size 时应淘汰最久未使用的条目"
+
+    # 覆盖或重新注册同名工具后不应返回旧工具的缓存结果
+    def replacement(query: str) -> str:
+        """替换后的工具"""
+        return f"新结果: {query}"
+
+    agent.register_tool(replacement, name="counting_tool", overwrite=True)
+    assert agent.invoke_tool_sync("counting_tool", {"query": "c"}) == "新结果: c", "覆盖工具后命中了旧工具的缓存"
+    agent.unregister_tool("counting_tool")
+    agent.register_tool(counting_tool)
+    assert agent.invoke_tool_sync("counting_tool", {"query": "c"}) == "结果: c", "重新注册后命中了旧工具的缓存"
+
+    # 共享缓存的智能体注册同一工具时可以互相命中
+    calls.clear()
+    first, second = MockAgent(tools=[counting_tool], cache=cache), MockAgent(tools=[counting_tool], cache=cache)
+    first.invoke_tool_sync("counting_tool", {"query": "d"})
+    second.invoke_tool_sync("counting_tool", {"query": "d"})
+    assert calls == ["d"], "共享缓存的智能体应复用同一工具的结果"
+
+    expired = AgentCache(ttl=0)
+    key = AgentCache.make_key("k")
+    expired.set(key, "v")
+    assert expired.get(key) is AgentCache.MISSING, "过期条目应失效"
+
+
+@pytest.mark.parametrize("error, expected_calls", [
+    (RuntimeError("工具执行失败"), 1),   # 确定性错误不重试
+    (ConnectionError("连接被重置"), 3),  # 暂时性错误重试至 max_retries 次
+    (TimeoutError("请求超时"), 3),
+    (httpx.ConnectError("连接失败"), 3),
+    (httpx.ReadTimeout("读取超时"), 3),
+    (requests.ConnectionError("连接失败"), 3),
+    (FileNotFoundError("文件不存在"), 1),  # 确定性的 OSError 不重试
+    (PermissionError("权限不足"), 1),
+])
+def test_tool_retry(error, expected_calls):
     """测试工具重试机制"""
-    print_header("测试工具重试机制")
-    
-    agent = MockAgent(tools=[failing_tool], max_retries=2)
-    
-    assert_raises(
-        ToolExecutionError,
-        "invoke_tool_sync 失败重试",
-        "failing_tool",
-        agent.invoke_tool_sync,
-        "failing_tool",
-        {"query": "测试"}
-    )
-
-
-def test_message_management():
-    """测试消息管理方法"""
-    print_header("测试消息管理方法")
-    
-    agent = MockAgent()
-    
+    calls = []
+
+    def flaky_tool(query: str) -> str:
+        """总是抛出指定异常的工具"""
+        calls.append(query)
+        raise error
+
+    agent = MockAgent(tools=[flaky_tool], max_retries=3)
+    agent.RETRY_BACKOFF = 0  # 测试中不等待退避时间
+
+    with pytest.raises(ToolExecutionError) as exc_info:
+        agent.invoke_tool_sync("flaky_tool", {"query": "测试"})
+    assert len(calls) == expected_calls
+    assert exc_info.value.original_error is error
+
+
+@pytest.mark.asyncio
+async def test_tool_retry_async():
+    """测试异步调用同样只重试暂时性错误"""
+    calls = []
+
+    def broken_tool(query: str) -> str:
+        """总是抛出确定性错误的工具"""
+        calls.append(query)
+        raise ValueError("参数错误")
+
+    agent = MockAgent(tools=[broken_tool], max_retries=3)
+
+    with pytest.raises(ToolExecutionError):
+        await agent.invoke_tool("broken_tool", {"query": "测试"})
+    assert len(calls) == 1, "确定性错误不应重试"
+
+
+@pytest.mark.parametrize("add, args, message_type", [
+    ("add_system_message", ("系统消息",), SystemMessage),
+    ("add_human_message", ("用户消息",), HumanMessage),
+    ("add_ai_message", ("AI消息",), AIMessage),
+    ("add_tool_message", ("工具结果", "call_123"), ToolMessage),
+])
+def test_add_message(agent, add, args, message_type):
+    """测试各类消息的添加方法"""
+    getattr(agent, add)(*args)
+    assert len(agent.state["messages"]) == 1
+    assert type(agent.state["messages"][0]) is message_type
+    assert agent.get_last_message() is agent.state["messages"][0]
+
+
+def test_message_management(agent):
+    """测试消息查询与清理方法"""
     agent.add_system_message("系统消息")
-    assert_equal(len(agent.state["messages"]), 1, "add_system_message", 1)
-    assert_true(isinstance(agent.state["messages"][0], SystemMessage), "消息类型为 SystemMessage", type(agent.state["messages"][0]).__name__, isinstance(agent.state["messages"][0], SystemMessage))
-    
     agent.add_human_message("用户消息")
-    assert_equal(len(agent.state["messages"]), 2, "add_human_message", 2)
-    assert_true(isinstance(agent.state["messages"][1], HumanMessage), "消息类型为 HumanMessage", type(agent.state["messages"][1]).__name__, isinstance(agent.state["messages"][1], HumanMessage))
-    
     agent.add_ai_message("AI消息")
-    assert_equal(len(agent.state["messages"]), 3, "add_ai_message", 3)
-    assert_true(isinstance(agent.state["messages"][2], AIMessage), "消息类型为 AIMessage", type(agent.state["messages"][2]).__name__, isinstance(agent.state["messages"][2], AIMessage))
-    
     agent.add_tool_message("工具结果", tool_call_id="call_123")
-    assert_equal(len(agent.state["messages"]), 4, "add_tool_message", 4)
-    assert_true(isinstance(agent.state["messages"][3], ToolMessage), "消息类型为 ToolMessage", type(agent.state["messages"][3]).__name__, isinstance(agent.state["messages"][3], ToolMessage))
-    
-    messages = agent.get_messages()
-    assert_equal(len(messages), 4, "get_messages 全部消息", 4)
-    
-    messages_no_system = agent.get_messages(include_system=False)
-    assert_equal(len(messages_no_system), 3, "get_messages 排除系统消息", 3)
-    
-    last = agent.get_last_message()
-    assert_true(last is not None, "get_last_message 返回消息", last, last is not None)
-    
+
+    assert len(agent.get_messages()) == 4
+    assert len(agent.get_messages(include_system=False)) == 3
+    assert agent.get_last_message() is not None
+
     agent.clear_messages()
-    assert_equal(len(agent.state["messages"]), 0, "clear_messages 清空消息", 0)
-    
-    last = agent.get_last_message()
-    assert_true(last is None, "get_last_message 空消息列表", last, last is None)
-
-
-def test_context_management():
-    """测试上下文管理方法"""
-    print_header("测试上下文管理方法")
-    
-    agent = MockAgent()
-    
-    agent.set_context("key1", "value1")
-    agent.set_context("key2", {"nested": "data"})
-    
-    assert_equal(agent.get_context("key1"), "value1", "get_context 获取字符串", "value1")
-    assert_equal(agent.get_context("key2"), {"nested": "data"}, "get_context 获取字典", {"nested": "data"})
-    assert_equal(agent.get_context("non_existent"), None, "get_context 不存在的键", None)
-    assert_equal(agent.get_context("non_existent", default="默认值"), "默认值", "get_context 带默认值", "默认值")
-
-
-def test_metadata_management():
-    """测试元数据管理方法"""
-    print_header("测试元数据管理方法")
-    
-    agent = MockAgent()
-    
-    agent.set_metadata("task_id", 123)
-    agent.set_metadata("user_id", "user_001")
-    
-    assert_equal(agent.get_metadata("task_id"), 123, "get_metadata 获取 task_id", 123)
-    assert_equal(agent.get_metadata("user_id"), "user_001", "get_metadata 获取 user_id", "user_001")
-    assert_equal(agent.get_metadata("non_existent"), None, "get_metadata 不存在的键", None)
-    assert_equal(agent.get_metadata("non_existent", default=0), 0, "get_metadata 带默认值", 0)
-
-
-def test_error_handling():
+    assert len(agent.state["messages"]) == 0
+    assert agent.get_last_message() is None
+
+    limit = settings.max_message_history
+    for i in range(limit + 5):
+        agent.add_human_message(f"消息{i}")
+    assert len(agent.state["messages"]) == limit, "消息历史超出上限时应丢弃最早消息"
+    assert agent.state["messages"][0].content == "消息5"
+    assert agent.get_last_message().content == f"消息{limit + 4}"
+
+    messages = agent.get_messages(include_system=False)
+    assert type(messages) is list, "get_messages 应返回列表"
+    assert type(agent.state["messages"]) is list, "state['messages'] 应保持列表类型"
+    assert messages is agent.state["messages"], "无系统消息时不应复制消息历史"
+    assert agent.get_messages() is agent.state["messages"], "包含系统消息时不应复制消息历史"
+    assert agent.state["messages"][-5:] == messages[-5:], "消息历史应支持切片"
+
+    # 超出上限时只丢弃最早的非系统消息，系统消息始终保留
+    agent.clear_messages()
+    agent.add_system_message("角色设定")
+    for i in range(limit + 5):
+        agent.add_human_message(f"消息{i}")
+    agent.add_system_message("追加指令")
+    messages = agent.state["messages"]
+    assert len(messages) == limit, "消息历史超出上限时应丢弃最早的非系统消息"
+    assert messages[0].content == "角色设定", "最早的系统消息不应被淘汰"
+    assert messages[1].content == "消息7"
+    assert messages[-1].content == "追加指令"
+    assert [m.content for m in agent.get_messages(include_system=False)][-1] == f"消息{limit + 4}"
+
+    agent.update_state(messages=[SystemMessage(content="系统消息"), HumanMessage(content="用户消息")])
+    assert len(agent.get_messages(include_system=False)) == 1, "update_state 替换消息后仍应过滤系统消息"
+
+
+@pytest.mark.parametrize("key, value", [
+    ("key1", "value1"),
+    ("key2", {"nested": "data"}),
+])
+def test_context_management(agent, key, value):
+    """测试上下文的设置与读取"""
+    agent.set_context(key, value)
+    assert agent.get_context(key) == value
+
+
+def test_context_default(agent):
+    """测试读取不存在的上下文"""
+    assert agent.get_context("non_existent") is None
+    assert agent.get_context("non_existent", default="默认值") == "默认值"
+
+
+@pytest.mark.parametrize("key, value", [
+    ("task_id", 123),
+    ("user_id", "user_001"),
+])
+def test_metadata_management(agent, key, value):
+    """测试元数据的设置与读取"""
+    agent.set_metadata(key, value)
+    assert agent.get_metadata(key) == value
+
+
+def test_metadata_default(agent):
+    """测试读取不存在的元数据"""
+    assert agent.get_metadata("non_existent") is None
+    assert agent.get_metadata("non_existent", default=0) == 0
+
+
+def test_checkpoint():
+    """测试检查点保存与恢复"""
+    checkpointer = Checkpointer(":memory:")
+    agent = MockAgent(checkpointer=checkpointer)
+
+    assert agent.save_checkpoint() is False, "缺少 task_id 时应跳过保存"
+
+    agent.set_metadata("task_id", "task-1")
+    agent.set_context("topic", "LLM")
+    agent.add_message(HumanMessage(content="你好"))
+    agent.add_message(AIMessage(content="你好，有什么可以帮你？"))
+    agent.update_state(status=AgentStatus.COMPLETED)
+    assert checkpointer.load("task-1") is not None, "进入 COMPLETED 时应自动保存检查点"
+
+    restored = MockAgent(checkpointer=checkpointer)
+    assert restored.load_checkpoint("task-1") is True
+    assert restored.state["status"] is AgentStatus.COMPLETED, "status 应恢复为枚举"
+    assert restored.get_context("topic") == "LLM"
+    assert restored.get_metadata("task_id") == "task-1"
+
+    messages = restored.get_messages()
+    assert len(messages) == 2
+    assert type(messages[1]) is AIMessage
+    assert messages[0].content == "你好"
+
+    assert restored.load_checkpoint("missing") is False, "不存在的检查点应返回 False"
+    checkpointer.close()
+
+
+def test_checkpoint_non_json_value():
+    """测试无法序列化的状态字段在检查点中被跳过，而不是恢复成字符串"""
+    checkpointer = Checkpointer(":memory:")
+    agent = MockAgent(checkpointer=checkpointer)
+    agent.set_metadata("task_id", "task-2")
+    agent.update_state(current_task="测试任务")
+    agent.set_context("handle", object())
+
+    assert agent.save_checkpoint() is True
+    restored = MockAgent(checkpointer=checkpointer)
+    assert restored.load_checkpoint("task-2") is True
+    assert restored.state["current_task"] == "测试任务", "可序列化的字段应正常恢复"
+    assert restored.state["context"] == {}, "无法序列化的字段应被跳过并使用初始值"
+    assert restored.get_metadata("task_id") == "task-2"
+    checkpointer.close()
+
+
+@pytest.mark.asyncio
+async def test_auto_checkpoint_off_loop(caplog):
+    """测试事件循环中的自动检查点在后台线程写入，缺少 task_id 时不告警"""
+    checkpointer = Checkpointer(":memory:")
+    threads = []
+    save = checkpointer.save
+
+    def recording_save(key, state):
+        threads.append(threading.current_thread())
+        save(key, state)
+
+    checkpointer.save = recording_save
+    agent = MockAgent(checkpointer=checkpointer)
+
+    # 项目日志器不向根日志器传播，需直接挂上 caplog 的处理器
+    base_logger = logging.getLogger("src.agents.base")
+    base_logger.addHandler(caplog.handler)
+    try:
+        with caplog.at_level(logging.WARNING, logger="src.agents.base"):
+            agent.update_state(status=AgentStatus.COMPLETED)
+    finally:
+        base_logger.removeHandler(caplog.handler)
+    assert not [r for r in caplog.records if r.levelno >= logging.WARNING], "缺少 task_id 时自动检查点不应输出警告"
+    assert threads == []
+
+    agent.set_metadata("task_id", "task-3")
+    agent.update_state(status=AgentStatus.FAILED)
+    await agent.wait_for_checkpoints()
+    assert len(threads) == 1
+    assert threads[0] is not threading.current_thread(), "事件循环中的检查点写入不应在事件循环线程执行"
+    restored = MockAgent(checkpointer=checkpointer)
+    assert restored.load_checkpoint("task-3") is True
+    assert restored.state["status"] is AgentStatus.FAILED
+    checkpointer.close()
+
+
+def test_error_handling(agent):
     """测试错误处理方法"""
-    print_header("测试错误处理方法")
-    
-    agent = MockAgent()
-    
     agent.set_error("测试错误信息")
-    assert_equal(agent.state["error"], "测试错误信息", "set_error 设置错误信息", "测试错误信息")
-    assert_equal(agent.state["status"], AgentStatus.FAILED, "set_error 状态变为 FAILED", AgentStatus.FAILED)
+    assert agent.state["error"] == "测试错误信息"
+    assert agent.state["status"] == AgentStatus.FAILED
 
 
 def test_prepare_messages_for_llm():
     """测试 LLM 消息准备"""
-    print_header("测试 LLM 消息准备")
-    
     agent = MockAgent(system_prompt="你是一个测试智能体")
     agent.add_human_message("你好")
     agent.add_ai_message("你好！有什么可以帮助你的？")
-    
+
     messages = agent.prepare_messages_for_llm()
-    
-    assert_equal(len(messages), 3, "prepare_messages_for_llm 消息数量", 3)
-    assert_true(isinstance(messages[0], SystemMessage), "第一条是系统消息", type(messages[0]).__name__, isinstance(messages[0], SystemMessage))
-    assert_equal(messages[0].content, "你是一个测试智能体", "系统消息内容", "你是一个测试智能体")
+
+    assert len(messages) == 3
+    assert type(messages[0]) is SystemMessage, "第一条应为系统消息"
+    assert messages[0].content == "你是一个测试智能体"
 
 
-def test_get_summary():
+def test_get_summary(agent):
     """测试状态摘要"""
-    print_header("测试状态摘要")
-    
-    agent = MockAgent()
     long_task = "这是一个非常非常非常非常非常非常非常非常非常非常非常非常非常非常非常非常非常长的任务描述，用于测试截断功能是否正常工作"
     agent.update_state(current_task=long_task)
     agent.add_human_message("测试消息")
     agent.register_tool(sample_search_tool)
-    
+
     summary = agent.get_states_summary()
-    
-    assert_equal(summary["name"], "mock_agent", "summary name", "mock_agent")
-    assert_equal(summary["status"], AgentStatus.IDLE, "summary status", AgentStatus.IDLE)
-    assert_equal(summary["message_count"], 1, "summary message_count", 1)
-    assert_equal(summary["tool_count"], 1, "summary tool_count", 1)
-    assert_equal(summary["has_error"], False, "summary has_error", False)
-    assert_true("..." in summary["current_task"], "summary current_task 截断", summary["current_task"], "..." in summary["current_task"])
-
-
-def test_run_method():
-    """测试 run 方法"""
-    print_header("测试 run 方法")
-    
-    async def run_test():
-        agent = MockAgent()
-        state = AgentState(
-            messages=[],
-            current_task="测试",
-            agent_type="mock",
-            status=AgentStatus.IDLE,
-            tools_output={},
-            context={},
-            error="",
-            metadata={}
-        )
-        
-        result = await agent.run(state)
-        assert_equal(result["status"], AgentStatus.COMPLETED, "run 方法执行", AgentStatus.COMPLETED)
-    
-    asyncio.run(run_test())
-
-
-def run_all_tests():
-    """运行所有测试"""
-    print("\n" + "="*60)
-    print("  ResGenie 智能体基类测试脚本")
-    print("  测试文件: src/agents/base.py")
-    print("="*60)
-    
-    test_agent_status()
-    test_agent_state()
-    test_agent_error()
-    test_tool_not_found_error()
-    test_tool_execution_error()
-    test_state_validation_error()
-    test_base_agent_init()
-    test_base_agent_repr_str()
-    test_state_management()
-    test_tool_registration()
-    test_tool_invocation_sync()
-    test_tool_invocation_async()
-    test_tool_retry()
-    test_message_management()
-    test_context_management()
-    test_metadata_management()
-    test_error_handling()
-    test_prepare_messages_for_llm()
-    test_get_summary()
-    test_run_method()
-    
-    print(stats.summary())
-    
-    if stats.failed > 0:
-        print("\n⚠️  存在失败的测试，请检查上述输出")
-        return 1
-    else:
-        print("\n🎉 所有测试通过！")
-        return 0
-
-
-if __name__ == "__main__":
-    exit(run_all_tests())
+
+    assert summary["name"] == "mock_agent"
+    assert summary["status"] == AgentStatus.IDLE
+    assert summary["message_count"] == 1
+    assert summary["tool_count"] == 1
+    assert summary["has_error"] is False
+    assert "..." in summary["current_task"], "过长的任务描述应被截断"
+
+
+def _new_state(task: str) -> AgentState:
+    """构造一份独立的初始状态，可变字段各自新建"""
+    return {
+        "messages": [],
+        "current_task": task,
+        "agent_type": "mock",
+        "status": AgentStatus.IDLE,
+        "tools_output": {},
+        "context": {},
+        "error": "",
+        "metadata": {},
+    }
+
+
+@pytest.mark.asyncio
+async def test_run_method(agent):
+    """测试 run 方法（多个状态通过 gather 并发执行）"""
+    states = [_new_state(f"测试{i}") for i in range(3)]
+
+    results = await asyncio.gather(*(agent.run(state) for state in states))
+    assert all(result["status"] is AgentStatus.COMPLETED for result in results)
+    assert [result["current_task"] for result in results] == ["测试0", "测试1", "测试2"], "结果顺序应与输入一致"
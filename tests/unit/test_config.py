@@ -0,0 +1,19 @@
+"""测试配置模块功能"""
+from src.core.config import get_settings, settings
+
+
+def test_get_settings_default():
+    """测试默认环境的配置只创建一个实例（不传参数、传 None 或默认环境名称结果相同）"""
+    assert get_settings() is settings
+    assert get_settings(None) is settings
+    assert get_settings(settings.resgenie_env) is settings
+
+
+def test_get_settings_env():
+    """测试指定其他环境时按环境缓存，且不影响默认配置"""
+    env = "production" if settings.resgenie_env != "production" else "testing"
+    other = get_settings(env)
+    assert other.resgenie_env == env
+    assert get_settings(env) is other, "同一环境应返回缓存的实例"
+    assert other is not settings
+    assert settings.resgenie_env != env, "默认配置的环境值不应被修改"
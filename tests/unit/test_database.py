@@ -1,143 +1,147 @@
 """测试Postgresql数据库模块功能"""
-# python -m tests.unit.test_database
-from src.core.database import engine, _get_database_url, get_db, get_db_context, init_db, drop_db, reset_db, get_engine_info, check_connection, close_all_connections
-from sqlalchemy import inspect
+import pytest
 
-def test_get_database_url():
-    """测试数据库URL获取函数"""
-    print("=== 测试数据库URL获取函数 ===")
+# 未安装数据库依赖的环境中跳过整个模块，而不是在收集阶段导入失败
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("psycopg2")
+pytest.importorskip("asyncpg")
+
+from src.core.database import Base, engine, _ensure_models_imported, _get_database_url, _get_async_database_url, get_db, get_db_context, get_async_db, init_db, drop_db, reset_db, get_engine_info, check_connection, close_all_connections
+from src.models import User
+from sqlalchemy import create_engine, inspect
+
+# 各测试共用同一个数据库并依次建表/删表，需在同一进程内按顺序执行
+pytestmark = pytest.mark.xdist_group("database")
 
-    url = _get_database_url()
-    print(f"数据库URL: {url}")
+MODEL_TABLES = {"users", "research_tasks", "documents", "agent_executions", "reports"}
+
+def _table_names() -> set:
+    """一次查询取得数据库中已存在的表名"""
+    return set(inspect(engine).get_table_names())
+
+def test_get_database_url(db_url):
+    """测试数据库URL获取函数"""
+    url = db_url
+    assert _get_database_url() is url, "数据库URL应只计算一次"
     assert url.startswith("postgresql://"), "URL协议错误"
     assert "localhost" in url, "URL主机错误"
     assert "5432" in url, "URL端口错误"
     assert "resgenie" in url, "URL数据库名错误"
-    print("√ 数据库URL测试通过")
 
 def test_get_db():
     """测试数据库会话获取函数"""
-    print("=== 测试数据库会话获取函数 ===")
-
-    db = next(get_db())
+    db_gen = get_db()
+    db = next(db_gen)
     assert db is not None, "数据库会话获取失败"
-    db.close()
-    print("√ 数据库会话测试通过")
+    db_gen.close()
+
+    db_gen = get_db()
+    assert next(db_gen) is not db, "每个请求应获得独立的数据库会话"
+    db_gen.close()
+
+    # 同一线程中同时进行的两个请求也不能共享会话
+    first, second = get_db(), get_db()
+    assert next(first) is not next(second), "并发请求共享了同一个会话"
+    first.close()
+    second.close()
 
 def test_get_db_context():
     """测试数据库上下文获取函数"""
-    print("=== 测试数据库上下文获取函数 ===")
-
     with get_db_context() as db:
         assert db is not None, "数据库上下文获取失败"
-    print("√ 数据库上下文测试通过")
-
-def test_init_db():
-    """测试数据库初始化函数"""
-    print("=== 测试数据库初始化函数 ===")
 
+@pytest.mark.parametrize("url, expected", [
+    ("postgresql://u:p@localhost:5432/resgenie", "postgresql+asyncpg://u:p@localhost:5432/resgenie"),
+    ("postgresql+psycopg2://u:p@localhost:5432/resgenie", "postgresql+asyncpg://u:p@localhost:5432/resgenie"),
+    ("sqlite:///resgenie.db", None),
+])
+def test_get_async_database_url(url, expected):
+    """测试异步URL转换：任意 PostgreSQL 驱动都替换为 asyncpg，其他数据库没有异步驱动"""
+    assert _get_async_database_url(url) == expected
+
+@pytest.mark.asyncio
+async def test_get_async_db():
+    """测试异步数据库会话获取函数"""
+    assert _get_async_database_url().startswith("postgresql+asyncpg://"), "异步URL驱动错误"
+
+    db_gen = get_async_db()
+    db = await db_gen.__anext__()
+    assert db is not None, "异步数据库会话获取失败"
+    await db_gen.aclose()
+
+def test_models_create_on_sqlite():
+    """测试模型不依赖 PostgreSQL 专有类型：JSON 列在 sqlite 上退回通用 JSON，可以正常建表"""
+    _ensure_models_imported()
+    sqlite_engine = create_engine("sqlite://")
+    try:
+        Base.metadata.create_all(sqlite_engine)
+        assert MODEL_TABLES <= set(inspect(sqlite_engine).get_table_names())
+    finally:
+        sqlite_engine.dispose()
+
+def test_init_db(db_schema):
+    """测试数据库初始化函数（表已由 db_schema 创建，再次初始化应跳过已存在的表）"""
     init_db()
 
-    inspector = inspect(engine)
-    tables = inspector.get_table_names()
-    for table_name in tables:
-        print(f"\n表: {table_name}")
-        columns = inspector.get_columns(table_name)
-        for col in columns:
-            print(f"  - {col['name']}: {col['type']}")
-    
-    assert "users" in tables, "users表未创建"
-    assert "research_tasks" in tables, "research_tasks表未创建"
-    assert "documents" in tables, "documents表未创建"
-    assert "agent_executions" in tables, "agent_executions表未创建"
-    assert "reports" in tables, "reports表未创建"
+    tables = _table_names()
+    assert MODEL_TABLES <= tables, f"表未创建: {MODEL_TABLES - tables}"
 
-    drop_db()
-    print("√ 数据库初始化测试通过")
-
-def test_drop_db():
+def test_drop_db(db_schema):
     """测试数据库清理函数"""
-    print("=== 测试数据库清理函数 ===")
-
-    init_db()
     drop_db()
 
-    inspector = inspect(engine)
-    tables = inspector.get_table_names()
-    assert "users" not in tables, "users表未删除"
-    assert "research_tasks" not in tables, "research_tasks表未删除"
-    assert "documents" not in tables, "documents表未删除"
-    assert "agent_executions" not in tables, "agent_executions表未删除"
-    assert "reports" not in tables, "reports表未删除"
+    tables = _table_names()
+    assert not MODEL_TABLES & tables, f"表未删除: {MODEL_TABLES & tables}"
 
-    print("√ 数据库清理测试通过")
+    # 恢复表结构，供后续使用 db_schema 的测试
+    init_db()
 
-def test_reset_db():
+def test_reset_db(db_schema):
     """测试数据库重置函数"""
-    print("=== 测试数据库重置函数 ===")
-
-    init_db()
     reset_db()
 
-    inspector = inspect(engine)
-    tables = inspector.get_table_names()
-    assert "users" in tables, "users表未创建"
-    assert "research_tasks" in tables, "research_tasks表未创建"
-    assert "documents" in tables, "documents表未创建"
-    assert "agent_executions" in tables, "agent_executions表未创建"
-    assert "reports" in tables, "reports表未创建"
+    tables = _table_names()
+    assert MODEL_TABLES <= tables, f"表未创建: {MODEL_TABLES - tables}"
 
-    print("√ 数据库重置测试通过")
+def test_db_session_rollback(db_session):
+    """测试 db_session 夹具在测试结束后回滚数据"""
+    db_session.add(User(username="fixture_user", email="fixture@example.com", password_hash="x"))
+    db_session.commit()
+    assert db_session.query(User).filter_by(username="fixture_user").count() == 1, "会话内应可见已提交的数据"
 
-def test_get_engine_info():
-    """测试数据库引擎信息获取函数"""
-    print("=== 测试数据库引擎信息获取函数 ===")
+    with get_db_context() as db:
+        assert db.query(User).filter_by(username="fixture_user").count() == 0, "外层事务未提交的数据不应对其他连接可见"
 
+def test_get_engine_info(db_url):
+    """测试数据库引擎信息获取函数"""
     info = get_engine_info()
-    print(info)
-    assert info['database_url'] == _get_database_url().replace("dev_password", "***"), "数据库URL不匹配"
-    print("√ 数据库引擎信息测试通过")
+    assert info['database_url'] == db_url.replace("dev_password", "***"), "数据库URL不匹配"
 
 def test_check_connection():
     """测试数据库连接检查函数"""
-    print("=== 测试数据库连接检查函数 ===")
-
     assert check_connection() == True, "数据库连接检查失败"
-    print("√ 数据库连接检查测试通过")
 
+# 保持为模块中的最后一个测试：dispose 会丢弃连接池中已预热的连接，放在最后避免其他测试重新建立连接。
+# 同组测试在同一进程内按定义顺序执行，无需额外的排序插件
 def test_close_all_connections():
     """测试关闭所有数据库连接函数"""
-    print("=== 测试关闭所有数据库连接函数 ===")
-
     # 建立持久连接（不使用 with，手动管理）
     conn = engine.connect()
-    
-    # 获取引擎信息
-    info_before = get_engine_info()
-    print(f"建立连接后 - 已检出连接: {info_before['checked_out']}")
-    assert info_before['checked_out'] >= 1, "连接未建立"
-    
-    # 关闭所有连接
-    close_all_connections()
-    
-    # 检查连接池状态（已检出连接应为 0）
-    info_after = get_engine_info()
-    print(f"关闭后 - 已检出连接: {info_after['checked_out']}")
-    
-    # 验证连接池已清空
-    assert info_after['checked_out'] == 0, "连接池未清空"
-    # 验证引擎仍然可以创建新连接（dispose 后引擎仍可用）
-    assert check_connection() == True, "引擎无法创建新连接"
-    
-    print("√ 数据库连接关闭测试通过")
-
-if __name__ == "__main__":
-    test_get_database_url()
-    test_get_db()
-    test_get_db_context()
-    test_init_db()
-    test_drop_db()
-    test_reset_db()
-    test_get_engine_info()
-    test_check_connection()
-    test_close_all_connections()
+    try:
+        # 获取引擎信息
+        info_before = get_engine_info()
+        assert info_before['checked_out'] >= 1, "连接未建立"
+        
+        # 关闭所有连接
+        close_all_connections()
+        
+        # 检查连接池状态（已检出连接应为 0）
+        info_after = get_engine_info()
+        
+        # 验证连接池已清空
+        assert info_after['checked_out'] == 0, "连接池未清空"
+        # 验证引擎仍然可以创建新连接（dispose 后引擎仍可用），该连接归还后留在新池中供 db_schema 清理时使用
+        assert check_connection() == True, "引擎无法创建新连接"
+    finally:
+        # dispose 不会关闭已检出的连接，需手动关闭，避免泄漏到数据库端
+        conn.close()
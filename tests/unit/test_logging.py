@@ -1,64 +1,56 @@
 """测试日志系统功能"""
-# python -m tests.unit.test_logging
-from src.core.logging import get_logger, init_logging, set_log_level, LogContext, log_function_call, log_exception
+import logging
+from logging.handlers import QueueHandler
+from pathlib import Path
+
+import orjson
+import pytest
+
+from src.core.config import settings
+from src.core.logging import get_logger, init_logging, set_log_level, LogContext, log_function_call, log_exception, JSONFormatter
+
+# 各测试修改同一组日志器的级别并写入相同的日志文件，需在同一进程内按顺序执行
+pytestmark = pytest.mark.xdist_group("logging")
 
 logger = get_logger("test")
 
 def test_basic_logging():
     """测试基本日志功能"""
-
-    print("=== 测试基本日志功能 ===")
-    logger.debug("这是一条调试信息")
-    logger.info("这是一条普通信息")
-    logger.warning("这是一条警告信息")
-    logger.error("这是一条错误信息")
-    logger.critical("这是一条严重错误信息")
-    print()
+    for level, message in (
+        (logging.DEBUG, "这是一条调试信息"),
+        (logging.INFO, "这是一条普通信息"),
+        (logging.WARNING, "这是一条警告信息"),
+        (logging.ERROR, "这是一条错误信息"),
+        (logging.CRITICAL, "这是一条严重错误信息"),
+    ):
+        logger.log(level, message)
 
 
 def test_log_level():
     """测试日志级别设置"""
-    
-    print("=== 测试日志级别设置 ===")
-    
-    print("当前日志级别: ", logger.level)
     logger.debug("debug日志--不会显示")
     logger.info("info日志--会显示")
     
-    print("\n切换到 DEBUG 级别")
     set_log_level("DEBUG")
-    print("当前日志级别: ", logger.level)
     logger.debug("debug日志--会显示")
     
-    print("\n切换回 INFO 级别")
     set_log_level("INFO")
     logger.debug("debug日志--不会显示")
-    print()
 
 
 def test_log_context():
     """测试日志上下文管理器"""
+    original_level = logger.level
     
-    print("=== 测试日志上下文管理器 ===")
-    
-    print("当前日志级别: ", logger.level)
-    logger.debug("debug日志--不会显示")
-    
-    print("\n进入 DEBUG 上下文")
     with LogContext(logger, "DEBUG"):
+        assert logger.isEnabledFor(logging.DEBUG), "上下文中应开启 DEBUG"
         logger.debug("在上下文中，debug调试信息会显示")
     
-    print("\n退出上下文")
-    logger.debug("退出上下文后，debug调试信息又不会显示了")
-    print()
+    assert logger.level == original_level, "退出上下文后应恢复原日志级别"
 
 
 def test_function_decorator():
     """测试函数调用日志装饰器"""
-    
-    print("=== 测试函数调用日志装饰器 ===")
-    logger.setLevel("DEBUG")
-    
     @log_function_call(logger)
     def add(a, b):
         return a + b
@@ -67,38 +59,51 @@ def test_function_decorator():
     def multiply(a, b):
         return a * b
     
-    result1 = add(3, 5)
-    result2 = multiply(4, 7)
-    print()
+    # 通过 LogContext 临时开启 DEBUG，退出后恢复原级别，避免后续测试都在 DEBUG 级别下格式化日志
+    original_level = logger.level
+    with LogContext(logger, "DEBUG"):
+        assert add(3, 5) == 8
+        assert multiply(4, 7) == 28
+    assert logger.level == original_level, "装饰器测试结束后应恢复日志级别"
 
 
-def test_exception_decorator():
-    """测试异常日志装饰器"""
+def test_function_decorator_lazy_args():
+    """测试 DEBUG 关闭时装饰器不计算参数的 repr"""
+    class Payload:
+        repr_calls = 0
+        
+        def __repr__(self):
+            Payload.repr_calls += 1
+            return "Payload()"
     
-    print("=== 测试异常日志装饰器 ===")
+    @log_function_call(logger)
+    def handle(payload):
+        return payload
+    
+    with LogContext(logger, "INFO"):
+        handle(Payload())
+    assert Payload.repr_calls == 0, "DEBUG 关闭时不应格式化参数"
     
+    with LogContext(logger, "DEBUG"):
+        handle(Payload())
+    assert Payload.repr_calls >= 1, "DEBUG 开启时应记录参数"
+
+
+def test_exception_decorator():
+    """测试异常日志装饰器"""
     @log_exception(logger)
     def divide(a, b):
         return a / b
     
-    try:
-        result = divide(10, 2)
-        print(f"divide(10, 2) = {result}")
-    except Exception as e:
-        print(f"捕获到异常: {e}")
+    assert divide(10, 2) == 5
     
-    try:
-        result = divide(10, 0)
-        print(f"divide(10, 0) = {result}")
-    except Exception as e:
-        pass
-    print()
+    # 装饰器记录异常后应原样抛出
+    with pytest.raises(ZeroDivisionError):
+        divide(10, 0)
 
 
 def test_multiple_loggers():
     """测试多个日志器"""
-    print("=== 测试多个日志器 ===")
-    
     logger1 = get_logger("module1")
     logger2 = get_logger("module2")
     logger3 = get_logger("module3")
@@ -106,13 +111,14 @@ def test_multiple_loggers():
     logger1.info("来自模块1的信息")
     logger2.info("来自模块2的信息")
     logger3.info("来自模块3的信息")
-    print()
+    
+    handlers = list(logger1.handlers)
+    assert get_logger("module1") is logger1, "同名日志器应复用"
+    assert logger1.handlers == handlers, "重复获取日志器不应重建处理器"
 
 
 def test_custom_init():
     """测试自定义初始化"""
-    print("=== 测试自定义初始化 ===")
-    
     custom_logger = init_logging(
         name="custom_app",
         level="DEBUG",
@@ -123,22 +129,31 @@ def test_custom_init():
     custom_logger.debug("自定义日志器的调试信息")
     custom_logger.info("自定义日志器的普通信息")
     custom_logger.warning("自定义日志器的警告信息")
-    print()
 
 
-if __name__ == "__main__":
-    print("ResGenie 日志系统测试\n")
-    print("=" * 50)
-    print()
+def test_queue_file_logging():
+    """测试文件日志通过队列在后台写入"""
+    queue_logger = init_logging(name="queue_app", level="INFO", log_to_console=False, log_to_file=True)
+    assert len(queue_logger.handlers) == 1, "文件处理器应由单个 QueueHandler 代理"
+    assert isinstance(queue_logger.handlers[0], QueueHandler), "文件日志未经过队列"
     
-    test_basic_logging()
-    test_log_level()
-    test_log_context()
-    test_function_decorator()
-    test_exception_decorator()
-    test_multiple_loggers()
-    test_custom_init()
+    queue_logger.info("队列日志信息")
+    # 重新初始化会停止后台线程，并先写完队列中的日志
+    init_logging(name="queue_app", log_to_console=False, log_to_file=False)
+    
+    content = (Path(settings.log_dir) / "queue_app.log").read_text(encoding="utf-8")
+    assert "队列日志信息" in content, "日志未写入文件"
+
+
+def test_json_formatter():
+    """测试 JSON 格式化器"""
+    formatter = JSONFormatter()
+    record = logging.LogRecord("test", logging.INFO, __file__, 10, "注册工具: %s", ("search",), None)
+    record.agent = "planner"
     
-    print("=" * 50)
-    print("所有测试完成！")
-    print("\n请检查 logs/ 目录中的日志文件")
+    output = formatter.format(record)
+    payload = orjson.loads(output)
+    assert payload["level"] == "INFO", "日志级别错误"
+    assert payload["message"] == "注册工具: search", "日志消息错误"
+    assert payload["agent"] == "planner", "extra 字段缺失"
+    assert "args" not in payload, "LogRecord 内置属性不应输出"